@@ -1,13 +1,17 @@
 import ast
+import asyncio
 from datetime import datetime
 
 from DBController import DBController
-db = DBController()
 
-with open('im_cooked.txt') as f:
-    for line in f.readlines():
-        data = ast.literal_eval(line)
-        for person in data:
-            person['birth_date'] = datetime.strptime(person['birth_date'], '%d/%m/%y')
-            print(person)
-            # db.create_user(person)
\ No newline at end of file
+async def main():
+    db = DBController()
+    with open('im_cooked.txt') as f:
+        for line in f.readlines():
+            data = ast.literal_eval(line)
+            for person in data:
+                person['birth_date'] = datetime.strptime(person['birth_date'], '%d/%m/%y')
+            print(await db.bulk_create_users(data))
+    await db.close()
+
+asyncio.run(main())
@@ -1,16 +1,16 @@
 from datetime import datetime
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi import FastAPI, HTTPException, Response
-from pydantic import BaseModel
-from typing import List, Dict
+from fastapi import FastAPI, HTTPException, Query, Response
+from pydantic import BaseModel, Field
+from typing import List, Dict, Optional
+import json
 import logging
 import re
-from apscheduler.schedulers.background import BackgroundScheduler
-from bcrypt import hashpw, gensalt, checkpw
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from dotenv import load_dotenv
 from typing import List, Dict
+import httpx
 import os
-import requests
 
 # Load environment variables
 load_dotenv()
@@ -18,8 +18,19 @@ load_dotenv()
 # Initialize classes
 from DBController import DBController
 from EventsManager import EventManager
+from SchemaManager import SchemaManager
+from RecommenderClient import RecommenderClient, CircuitOpenError
+from PasswordHasher import PasswordHasher, HasherBusyError
+from EventPipeline import EventPipeline
+from RecommendationCache import RecommendationCache
+from RegionLocator import RegionLocator
 db = DBController()
 em = EventManager()
+schema = SchemaManager()
+recommender = RecommenderClient()
+hasher = PasswordHasher()
+reco_cache = RecommendationCache()
+region_locator = RegionLocator()
 
 # Initialize app
 app = FastAPI(debug=True)
@@ -32,19 +43,27 @@ app.add_middleware(
 )
 
 # Initialize scheduler
-scheduler = BackgroundScheduler()
-
-# ------------------ Helper ------------------ 
+scheduler = AsyncIOScheduler()
 
-def hash_password(password):
+@app.on_event("startup")
+async def startup():
     """
-    Function:   Hashes a password for storing in db
-    Input:      password:str
-    Output:     hashed_password:bool, salt:??
+    Creates the db constraints and indexes before serving requests, logs any index that is not online yet
+    and starts the scheduled jobs.
     """
-    salt = gensalt()
-    hashed_password = hashpw(password.encode('utf-8'), salt)
-    return hashed_password
+    res = await schema.migrate()
+    if not res['success']:
+        logging.error(f"Schema migration incomplete, failed: {res['failed']}")
+    try:
+        status = await schema.get_index_status()
+        for index in status['indexes']:
+            if index['state'] != 'ONLINE':
+                logging.warning(f"Index {index['name']} is {index['state']} ({index['populationPercent']}% populated)")
+    except Exception as e:
+        logging.error(f"Failed to retrieve index status: {e}")
+    scheduler.start()
+
+# ------------------ Helper ------------------ 
 
 def validate_password(password):
     """
@@ -71,54 +90,22 @@ def validate_password(password):
     
     return True, "Password is valid."
 
-def verify_password(input_password, stored_hashed_password):
-    """
-    Function:   Verifies inputted text password with hashed password in db
-    Input:      input_password:str, stored_hashed_password:str
-    Output:     success:bool
-    """
-    return checkpw(input_password.encode('utf-8'), stored_hashed_password.tobytes())
-
 def get_nearest_region(latitude, longitude):
     """
     Function:   Takes the lat long position and converts it into one of the 5 regions in SG.
     Input:      latitude:str, longitude:str
     Output:     location:str
     """
-    try:
-        latitude, longitude = float(latitude), float(longitude)
-        min_distance = float("inf")
-        nearest_region = "Unknown"
-        
-        for region, points in REGION_LOCATIONS.items():
-            for lat, lon in points:
-                distance = calculate_distance(latitude, longitude, lat, lon)
-                if distance < min_distance:
-                    min_distance = distance
-                    nearest_region = region
-        
-        return nearest_region
-    except (TypeError, ValueError):
-        return "Unknown"
+    return region_locator.nearest(latitude, longitude)
 
-def make_recommendation_request(url, data):
+async def make_recommendation_request(url, data):
     """
     Function:   Handles requests made to recommendation system (aka ben).
     Input:      data: json
     Output:     res: json
     """
-    HEADERS = {
-        "Accept": "application/json"
-    }
-    data = {
-        
-    }
     try:
-<<<<<<< HEAD
-        response = requests.post(url, headers=HEADERS, timeout=10)
-=======
-        response = requests.get(url, data, headers=HEADERS, timeout=30)
->>>>>>> dev
+        response = await recommender.post(url, data)
 
         if response.status_code == 200:
             return Response(content=response.text, status_code=200, media_type="application/json")
@@ -129,18 +116,21 @@ def make_recommendation_request(url, data):
         else:
             return Response(content=f"Unexpected error: {response.text}", status_code=response.status_code, media_type="application/json")
 
-    except requests.exceptions.RequestException as e:
-        logging.error(f"Recommendation API request failed: {e}")
-        return {}
+    except CircuitOpenError as e:
+        logging.warning(f"Recommendation API unavailable: {e}")
+        return Response(content=json.dumps({'detail': str(e)}), status_code=503, media_type="application/json")
+    except httpx.HTTPError as e:
+        logging.error(f"Recommendation API request failed: {e!r}")
+        return Response(content=json.dumps({'detail': f'Recommendation API request failed: {e!r}'}), status_code=502, media_type="application/json")
 
-def access_friends_recommendation(endpoint, data):
-    return make_recommendation_request(
+async def access_friends_recommendation(endpoint, data):
+    return await make_recommendation_request(
         f'{os.getenv("FRIEND_RECOMMENDATION_ENDPOINT")}/{endpoint}', 
         data
     )
 
-def access_events_recommendation(endpoint, data):
-    return make_recommendation_request(
+async def access_events_recommendation(endpoint, data):
+    return await make_recommendation_request(
         f'{os.getenv("EVENT_RECOMMENDATION_ENDPOINT")}/{endpoint}', 
         data
     )
@@ -208,19 +198,24 @@ class AddPostRequest(BaseModel):
     interests: List[str]
 
 class AddCommentRequest(BaseModel):
-    title: str
+    threadid: str
     username: str
     description: str
 
+class GetPostRecommendationsRequest(BaseModel):
+    username: str
+    limit: int = Field(20, ge=1, le=100)
+    cursor: Optional[str] = None
+
 # ------------------ Routes ------------------
 
 @app.get("/getRandomProfiles")
-def get_random_profiles():
+async def get_random_profiles():
     """
     Gets random profiles to show on the holding page.
     """
     try:
-        res = db.get_random_users()
+        res = await db.get_random_users()
         if not res['success']:
             raise HTTPException(status_code=400, detail=res['message'])
         return res
@@ -230,12 +225,76 @@ def get_random_profiles():
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 @app.get("/getRandomEvents")
-def get_random_events():
+async def get_random_events():
     """
     Gets random events to show on the holding page.
     """
     try:
-        res = db.get_random_events()
+        res = await db.get_random_events()
+        if not res['success']:
+            raise HTTPException(status_code=400, detail=res['message'])
+        return res
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+@app.get("/getEvents")
+async def get_events(limit: int = Query(50, ge=1, le=200), cursor: Optional[str] = None):
+    """
+    Gets a page of upcoming events, cursor is next_cursor of the previous page.
+    """
+    try:
+        res = await db.get_events(limit, cursor)
+        if not res['success']:
+            raise HTTPException(status_code=400, detail=res['message'])
+        return res
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+@app.get("/getEventsNear")
+async def get_events_near(latitude: float, longitude: float, radius_km: float = 5, limit: int = Query(50, ge=1, le=500)):
+    """
+    Gets the events within radius_km of a position, nearest first, for the events map.
+    """
+    try:
+        res = await db.get_events_near({
+            'latitude': latitude, 'longitude': longitude, 'radius_km': radius_km, 'limit': limit
+        })
+        if not res['success']:
+            raise HTTPException(status_code=400, detail=res['message'])
+        return res
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+@app.get("/events/within")
+async def get_events_within(
+    min_lat: Optional[float] = None, min_long: Optional[float] = None,
+    max_lat: Optional[float] = None, max_long: Optional[float] = None,
+    latitude: Optional[float] = None, longitude: Optional[float] = None, radius_km: Optional[float] = None,
+    start: Optional[str] = None, end: Optional[str] = None,
+    categories: Optional[List[str]] = Query(None),
+    zoom: int = 14, limit: int = Query(500, ge=1, le=1000),
+):
+    """
+    Gets the markers of the events map for a viewport (min_lat, min_long, max_lat, max_long) or a circle
+    (latitude, longitude, radius_km), clustered server-side at low zoom levels.
+    """
+    viewport = None not in (min_lat, min_long, max_lat, max_long)
+    circle = None not in (latitude, longitude, radius_km)
+    if not viewport and not circle:
+        raise HTTPException(status_code=400, detail="Either min_lat, min_long, max_lat, max_long or latitude, longitude, radius_km are required.")
+    try:
+        res = await db.get_events_within({
+            'min_lat': min_lat, 'min_long': min_long, 'max_lat': max_lat, 'max_long': max_long,
+            'latitude': latitude, 'longitude': longitude, 'radius_km': radius_km if circle else None,
+            'start': start, 'end': end, 'categories': categories,
+            'zoom': zoom, 'limit': limit,
+        })
         if not res['success']:
             raise HTTPException(status_code=400, detail=res['message'])
         return res
@@ -244,8 +303,43 @@ def get_random_events():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+@app.on_event("shutdown")
+async def close_connections():
+    """
+    Closes the db driver, Eventbrite and recommender connection pools and password hashing pool.
+    """
+    scheduler.shutdown(wait=False)
+    await db.close()
+    await em.close()
+    await recommender.close()
+    hasher.shutdown()
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Gets runtime metrics of the password hashing pool, recommender circuit breakers, recommendation cache
+    and the Eventbrite venue/organizer/category cache.
+    """
+    return {
+        'success': True,
+        'password_hasher': hasher.stats(),
+        'recommender': recommender.stats(),
+        'recommendation_cache': reco_cache.stats(),
+        'reference_cache': em.reference_cache.stats()
+    }
+
+@app.get("/schemaStatus")
+async def schema_status():
+    """
+    Gets the state of every db index, online is True once all of them can serve lookups.
+    """
+    try:
+        return {'success': True, **await schema.get_index_status()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
 @app.post("/signUp")
-def signup(request: UserDetailsRequest):
+async def signup(request: UserDetailsRequest):
     """
     Creates a new account for the user in the graph and vector dbs if their username and password are valid.
     """
@@ -255,54 +349,62 @@ def signup(request: UserDetailsRequest):
             raise HTTPException(status_code=400, detail=password_check[1])
 
         user_data = request.model_dump()
-        user_data['password'] = hash_password(request.password)
+        user_data['password'] = await hasher.hash(request.password)
         user_data['birth_date'] = datetime.strptime(user_data['birth_date'], '%d/%m/%y')
 
-        res = db.create_user(user_data)
+        res = await db.create_user(user_data)
         if not res['success']:
             raise HTTPException(status_code=400, detail=res['message'])
 
         data = {
             'contents': [request.interests],
-            'ids': [request.username]
+            'ids': [request.username],
+            # new users are interested in each of their interests with weightage 1, see DBController.create_user
+            'weights': [[1.0] * len(request.interests)]
         }
-        res = access_friends_recommendation('store', data)
+        res = await access_friends_recommendation('store', data)
         if res.status_code != 200:
             return res
+        feed = await db.rebuild_feed({'username': request.username})
+        if not feed['success']:
+            logging.error(f"Failed to build forum feed of {request.username}: {feed['message']}")
         return {'success': True, 'message': "Successfully signed up."}
     except HTTPException as e:
         raise e
+    except HasherBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 
 @app.post("/login")
-def login(request: LoginRequest):
+async def login(request: LoginRequest):
     """ 
     Redirects users to Spotify's login page for authentication after verifying username and password.
     """
     try:
-        res = db.attempt_login({
-            'username': request.username,
-            'password': hash_password(request.password)
-        })
+        res = await db.get_password_hash({'username': request.username})
         if not res['success']:
             raise HTTPException(status_code=400, detail=res['message'])
+        if not await hasher.verify(request.password, res['password']):
+            raise HTTPException(status_code=400, detail="Invalid username or password.")
         return {'success': True, 'message': "Login successful."}
     except HTTPException as e:
         raise e
+    except HasherBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}.")
 
 
 @app.post("/getUser")
-def get_user(request: GetUserRequest):
+async def get_user(request: GetUserRequest):
     """
     Gets user information for profile page.
     """
     try:
         print(request)
-        res = db.get_user(request.model_dump())
+        res = await db.get_user(request.model_dump())
         if not res['success']:
             raise HTTPException(status_code=400, detail=res['message'])
         return res
@@ -313,14 +415,26 @@ def get_user(request: GetUserRequest):
 
 
 @app.post("/updateUser")
-def update_user(request: UserDetailsRequest):
+async def update_user(request: UserDetailsRequest):
     """
     Updates users' details in the db.
     """
     try:
-        res = db.update_user(request.model_dump())
+        res = await db.update_user(request.model_dump())
         if not res['success']:
             raise HTTPException(status_code=400, detail=res['message'])
+        await reco_cache.invalidate_user(request.username)
+        feed = await db.rebuild_feed({'username': request.username})
+        if not feed['success']:
+            logging.error(f"Failed to rebuild forum feed of {request.username}: {feed['message']}")
+        # keep the user's vector in step with their interests, updated interests have weightage 1
+        stored = await access_friends_recommendation('store', {
+            'contents': [request.interests],
+            'ids': [request.username],
+            'weights': [[1.0] * len(request.interests)]
+        })
+        if stored.status_code != 200:
+            logging.error(f"Failed to update the vector of {request.username}: {stored.body}")
         return res
     except HTTPException as e:
         raise e
@@ -329,14 +443,15 @@ def update_user(request: UserDetailsRequest):
 
 
 @app.post("/addFriend")
-def add_friend(request: FriendshipRequest):
+async def add_friend(request: FriendshipRequest):
     """
     Adds a friend for a user.
     """
     try:
-        res = db.create_friendship(request.model_dump())
+        res = await db.create_friendship(request.model_dump())
         if not res['success']:
             raise HTTPException(status_code=400, detail=res['message'])
+        await reco_cache.invalidate_user(request.username1, request.username2)
         return res
     except HTTPException as e:
         raise e
@@ -345,16 +460,15 @@ def add_friend(request: FriendshipRequest):
 
 
 @app.get("/getFriends")
-def get_friends(request: GetUserRequest):
+async def get_friends(request: GetUserRequest):
     """
     Gets all friends for a user.
     """
     try:
-        user_details = db.get_user(request.model_dump())
-        if not user_details['success']:
-            raise HTTPException(status_code=400, detail=user_details['message'])
-        friend_details = [db.get_user(friend) for friend in user_details['friends']]
-        return {'success': True, 'message': 'Friends retrieved successfully', 'friends': friend_details}
+        friends = await db.get_friends(request.model_dump())
+        if not friends['success']:
+            raise HTTPException(status_code=400, detail=friends['message'])
+        return {'success': True, 'message': 'Friends retrieved successfully', 'friends': friends['data']}
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -362,29 +476,35 @@ def get_friends(request: GetUserRequest):
 
 
 @app.get("/getFriendRecommendations")
-def get_friend_recommendations(request: GetUserRequest):
+async def get_friend_recommendations(request: GetUserRequest):
     """
     Gets friend recommendations for a user based on interests using similarity search algorithm.
     """
     try:
-        interests = db.get_user_interests(request.model_dump())
+        interests = await db.get_user_interests(request.model_dump())
         if not interests['success']:
             raise HTTPException(status_code=500, detail=interests['message'])
+        cached = await reco_cache.get('friends', request.username, interests['data'])
+        if cached is not None:
+            return cached
         data = {
-            'contents': interests[data],
+            'contents': [interests['data']],
             'ids': [request.username],
+            'weights': [interests['weights']],
             'top_n': 20
         }
-        res = access_friends_recommendation('retrieve', data)
+        res = await access_friends_recommendation('retrieve', data)
         if res.status_code != 200:
             return res
         
-        recommendations = {'recommendations': []}
-        for user, users in res.items():
-            for username, dist in users:
-                recommendations['recommendations'].append(db.get_user(username))
+        usernames = [username for users in json.loads(res.body).values() for username, dist in users]
+        users = await db.get_users({'usernames': usernames})
+        if not users['success']:
+            raise HTTPException(status_code=500, detail=users['message'])
+        recommendations = {'recommendations': users['data']}
         recommendations['success'] = True
         recommendations['message'] = 'Retrieved friend recommendations successfully.'
+        await reco_cache.set('friends', request.username, interests['data'], recommendations)
         return recommendations
     except HTTPException as e:
         raise e
@@ -393,14 +513,15 @@ def get_friend_recommendations(request: GetUserRequest):
 
 
 @app.post("/removeFriend")
-def remove_friend(request: FriendshipRequest):
+async def remove_friend(request: FriendshipRequest):
     """
     Removes a friend for a user.
     """
     try:
-        res = db.delete_friendship(request.model_dump())
+        res = await db.delete_friendship(request.model_dump())
         if not res['success']:
             raise HTTPException(status_code=400, detail=res['message'])
+        await reco_cache.invalidate_user(request.username1, request.username2)
         return res
     except HTTPException as e:
         raise e
@@ -409,22 +530,23 @@ def remove_friend(request: FriendshipRequest):
 
 
 @app.post("/addEvents")
-def add_events(request: AddEventsRequest):
+async def add_events(request: AddEventsRequest):
     """
     Creates an event from users through the UI.
     """
     try:
-        res = db.create_or_update_event(request.model_dump())
+        res = await db.create_or_update_event(request.model_dump())
         if not res['success']:
             raise HTTPException(status_code=400, detail=res['message'])
         
         data = {
             'contents': [request.model_dump()],
-            'ids': [request.username]
+            'ids': [str(request.eventid)]
         }
-        res = access_events_recommendation('store', data)
+        res = await access_events_recommendation('store', data)
         if res.status_code != 200:
             return res
+        await reco_cache.invalidate_kind('events')
         return {'success': True, 'message': "Events added successfully."}
     except HTTPException as e:
         raise e
@@ -433,28 +555,33 @@ def add_events(request: AddEventsRequest):
 
 
 @app.get("/getEventRecommendations")
-def get_event_recommendations(request: GetUserRequest):
+async def get_event_recommendations(request: GetUserRequest):
     """
     Gets event recommendations for a user based on interests using similarity search algorithm.
     """
     try:
-        interests = db.get_user_interests(request.model_dump())
+        interests = await db.get_user_interests(request.model_dump())
         if not interests['success']:
             raise HTTPException(status_code=500, detail=interests['message'])
+        cached = await reco_cache.get('events', request.username, interests['data'])
+        if cached is not None:
+            return cached
         data = {
-            'contents': interests[data],
+            'contents': [interests['data']],
             'ids': [request.username],
             'top_n': 10
         }
-        res = access_events_recommendation('retrieve', data)
+        res = await access_events_recommendation('retrieve', data)
         if res.status_code != 200:
             return res
         
-        recommendations = {'recommendations': []}
-        for user, users in res.items():
-            for username, dist in users:
-                recommendations['recommendations'].append(db.get_user(username))
+        eventids = [eventid for events in json.loads(res.body).values() for eventid, dist in events]
+        events = await db.get_events_by_ids({'eventids': eventids})
+        if not events['success']:
+            raise HTTPException(status_code=500, detail=events['message'])
+        recommendations = {'recommendations': events['events']}
         recommendations['success'] = True
+        await reco_cache.set('events', request.username, interests['data'], recommendations)
         return recommendations
     except HTTPException as e:
         raise e
@@ -463,12 +590,12 @@ def get_event_recommendations(request: GetUserRequest):
 
 
 @app.post("/joinEvents")
-def join_events(request: JoinEventsRequest):
+async def join_events(request: JoinEventsRequest):
     """
     Adds an event for the user.
     """
     try:
-        res = db.join_events(request.model_dump())
+        res = await db.join_events(request.model_dump())
         if not res['success']:
             raise HTTPException(status_code=400, detail=res['message'])
         return res
@@ -479,12 +606,12 @@ def join_events(request: JoinEventsRequest):
 
 
 @app.post("/addPost")
-def add_post(request: AddPostRequest):
+async def add_post(request: AddPostRequest):
     """
     Creates a post for the forum page.
     """
     try:
-        res = db.create_thread(request.model_dump())
+        res = await db.create_thread(request.model_dump())
         if not res['success']:
             raise HTTPException(status_code=400, detail=res['message'])
         return res
@@ -495,12 +622,12 @@ def add_post(request: AddPostRequest):
 
 
 @app.post("/addComment")
-def add_comment(request: AddCommentRequest):
+async def add_comment(request: AddCommentRequest):
     """
     Adds a comment under the post on the forum page.
     """
     try:
-        res = db.create_comment(request.model_dump())
+        res = await db.create_comment(request.model_dump())
         if not res['success']:
             raise HTTPException(status_code=400, detail=res['message'])
         return res
@@ -510,56 +637,93 @@ def add_comment(request: AddCommentRequest):
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 
+@app.get("/getThread")
+async def get_thread(threadid: str, limit: int = Query(20, ge=1, le=100)):
+    """
+    Gets a post with its interests and first page of comments.
+    """
+    try:
+        res = await db.get_thread({'threadid': threadid, 'limit': limit})
+        if not res['success']:
+            raise HTTPException(status_code=404, detail=res['message'])
+        return res
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+@app.get("/getComments")
+async def get_comments(threadid: str, limit: int = Query(20, ge=1, le=100), cursor: Optional[str] = None):
+    """
+    Gets a page of comments of a post, cursor is next_cursor of the previous page.
+    """
+    try:
+        res = await db.get_comments({'threadid': threadid, 'limit': limit, 'cursor': cursor})
+        if not res['success']:
+            raise HTTPException(status_code=400, detail=res['message'])
+        return res
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
 @app.get("/getPostRecommendations")
-def get_post_recommendations(request: GetUserRequest):
+async def get_post_recommendations(request: GetPostRecommendationsRequest):
     """
-    Gets post recommendations for the forum page using a recommendation system? (unimplemented).
+    Gets the user's forum feed, posts ranked by how well their interests match the user's and by recent activity.
+    Pages through posts with limit, and cursor set to next_cursor of the previous page.
     """
     try:
-        # Temporary implementation  
-        threads = db.get_threads()
+        threads = await db.get_feed({
+            'username': request.username, 'limit': request.limit, 'cursor': request.cursor
+        })
         if not threads['success']:
-            raise HTTPException(status_code=500, detail=interests['message'])
-        return threads 
-
-        # If we implement recommendation system for posts one day;
-
-        # interests = db.get_user_interests(request.model_dump())
-        # if not interests['success']:
-        #     raise HTTPException(status_code=500, detail=interests['message'])
-        # data = {
-        #     'contents': interests[data],
-        #     'ids': [request.username]
-        # }
-        # res = make_recommendation_request('retrieve', data)
-        # if res.status_code != 200:
-        #     return res
-        
-        # recommendations = {'recommendations': []}
-        # for user, users in res.items():
-        #     for username, dist in users:
-        #         recommendations['recommendations'].append(db.get_user(username))
-        # recommendations['success'] = True
-        # return recommendations
+            raise HTTPException(status_code=400, detail=threads['message'])
+        return threads
     except HTTPException as e:
         raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
-# def update_events():
-#     """
-#     Function to update the database with events once a day based on scheduler
-#     """
-#     try:
-#         events = em.get_events()
-#         for idx, event in enumerate(events):
-#             event['venue_region'] = get_nearest_region(event.get('venue_lat'), event.get('venue_long'))
-#             event['type'] = 'Networking'  # how should we extract event type
-#             db.create_or_update_event(event)
-#             logging.info(f"Daily event {idx} update successful.")
-#     except Exception as e:
-#         logging.error(f"Error updating events: {e}")
-
-# Schedule the update to run daily at midnight
-# scheduler.add_job(update_events, 'interval', days=1, next_run_time=datetime.now())
-# scheduler.start()
+async def embed_events(events):
+    """
+    Function:   Stores events in the events vector db
+    Input:      events: list of json
+    Output:     success: bool
+    """
+    res = await access_events_recommendation('store_events', {
+        'contents': events,
+        'ids': [str(event['eventid']) for event in events]
+    })
+    if res.status_code != 200:
+        logging.error(f"Failed to embed {len(events)} events: {res.body}")
+        return False
+    await reco_cache.invalidate_kind('events')
+    return True
+
+pipeline = EventPipeline(em, db, get_nearest_region, embed_events)
+
+async def sync_events():
+    """
+    Function:   Incrementally syncs scraped events into the db and vector db through the event pipeline.
+                Events whose content hash is unchanged are skipped, only events whose embedded fields changed
+                are re-embedded, and events that have ended are soft-expired.
+    Input:      None
+    Output:     stats: json
+    """
+    try:
+        stats = await pipeline.run()
+        logging.info(f"Event sync finished: {stats}")
+        return stats
+    except Exception as e:
+        logging.error(f"Error syncing events: {e}")
+        return {}
+
+# Schedule the incremental sync, disabled unless EVENT_SYNC_ENABLED is set
+if os.getenv("EVENT_SYNC_ENABLED", "false").lower() == "true":
+    scheduler.add_job(
+        sync_events, 'interval',
+        minutes=int(os.getenv("EVENT_SYNC_INTERVAL_MINUTES", 15)),
+        next_run_time=datetime.now(),
+        max_instances=1, coalesce=True
+    )
@@ -1,15 +1,52 @@
 from QueryManager import QueryManager
+from Database import AsyncDatabase
+import base64
 import datetime
+import json as jsonlib
+import math
 import neo4j.time
+import os
 import random
 
+def encode_cursor(*values):
+    '''
+    Function:   Encodes the sort key of the last item of a page into an opaque cursor for the next page
+    Input:      values (str, number or datetime)
+    Output:     cursor: str
+    '''
+    values = [value.isoformat() if isinstance(value, (datetime.datetime, neo4j.time.DateTime)) else value for value in values]
+    return base64.urlsafe_b64encode(jsonlib.dumps(values).encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor, size):
+    '''
+    Function:   Decodes a cursor made by encode_cursor
+    Input:      cursor: str or None, size: number of values in the cursor
+    Output:     list of values, all None when there is no cursor
+    '''
+    if not cursor:
+        return [None] * size
+    try:
+        values = jsonlib.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except ValueError:
+        raise ValueError("Invalid cursor.")
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Invalid cursor.")
+    return values
+
 class DBController:
     def __init__(self):
-        self.qm = QueryManager()
+        self.qm = QueryManager(AsyncDatabase())
+        # forum feeds keep the best feed_size threads per user, scored log(1 + interest overlap) + activity / feed_tau,
+        # so activity feed_tau seconds newer outranks about e (2.7) times more interest overlap
+        self.feed_size = int(os.getenv("FORUM_FEED_SIZE", 200))
+        self.feed_tau = float(os.getenv("FORUM_FEED_TAU_SECONDS", 45000))
+
+    async def close(self):
+        await self.qm.db.close()
 
     ## USER METHODS
 
-    def create_user(self, json):
+    async def create_user(self, json):
         '''
         Function:   Instantiates a User Node
         Input:      JSON with username, password (hashed), email, birth_date (datetime), gender, region
@@ -17,27 +54,28 @@ class DBController:
         Output:     None
         '''
         try:
-            self.qm.create_user(json)
-
-            for topic in json.get("interests", []):
-                self.qm.create_user_interested_topic({
-                    "username": json["username"],
-                    "topic": topic,
-                    "weightage": 1
-                })
-
-            for topic in json.get("skills", []):
-                self.qm.create_user_skilled_topic({
-                    "username": json["username"],
-                    "topic": topic,
-                    "weightage": 1
-                })
-
+            await self.qm.create_users({"users": [json], "weightage": 1})
             return {"success": True, "message": "User created successfully"}
         except Exception as e:
             return {"success": False, "message": str(e)}
 
-    def update_user(self, json):
+    async def bulk_create_users(self, users, batch_size=500):
+        '''
+        Function:   Instantiates many User Nodes, batch_size users per transaction
+        Input:      list of JSON in the same format as create_user, batch_size (int)
+        Output:     JSON with number of users created
+        '''
+        created = 0
+        try:
+            for i in range(0, len(users), batch_size):
+                batch = users[i:i + batch_size]
+                await self.qm.create_users({"users": batch, "weightage": 1})
+                created += len(batch)
+            return {"success": True, "message": f"{created} users created successfully", "created": created}
+        except Exception as e:
+            return {"success": False, "message": str(e), "created": created}
+
+    async def update_user(self, json):
         '''
         Function:   Updates fields of a User Node
         Input:      JSON with username, email, region
@@ -45,28 +83,17 @@ class DBController:
         Output:     None
         '''
         try:
-            self.qm.update_user(json)
-            self.qm.delete_user_interests_skills(json)
-
-            for topic in json.get("interests", []):
-                self.qm.create_user_interested_topic({
-                    "username": json["username"],
-                    "topic": topic,
-                    "weightage": 1
-                })
-
-            for topic in json.get("skills", []):
-                self.qm.create_user_skilled_topic({
-                    "username": json["username"],
-                    "topic": topic,
-                    "weightage": 1
-                })
-
+            await self.qm.update_user_with_topics({
+                **json,
+                "interests": json.get("interests", []),
+                "skills": json.get("skills", []),
+                "weightage": 1
+            })
             return {"success": True, "message": "User updated successfully."}
         except Exception as e:
             return {"success": False, "message": str(e)}
 
-    def get_user(self, json):
+    async def get_user(self, json):
         '''
         Function:   Gets public user data given username
         Input:      JSON with username
@@ -74,7 +101,7 @@ class DBController:
 		            about_me, linkedin_url, github_url,  interests: [name of topic], skills: [(<same as interests>)] 
         '''
         try:
-            user = self.qm.get_user(json)[0].data()["u"]
+            user = (await self.qm.get_user(json))[0].data()["u"]
             user.pop("password", None)  # Safer way to remove password
             user["birth_date"] = user["birth_date"].to_native()
 
@@ -82,202 +109,453 @@ class DBController:
         except Exception as e:
             return {"success": False, "message": str(e)}
 
-    def get_user_interests(self, json):
+    async def get_users(self, json):
+        '''
+        Function:   Gets public user data for many usernames in one query
+        Input:      JSON with usernames (list of str)
+        Output:     JSON with list of users in the same order as usernames, unknown usernames are skipped
+        '''
+        try:
+            users = [self._public_user(record.data()["u"]) for record in await self.qm.get_users(json)]
+            return {"success": True, "message": "Successfully retrieved users data", "data": users}
+        except Exception as e:
+            return {"success": False, "message": str(e)}
+
+    async def get_friends(self, json):
+        '''
+        Function:   Gets public user data of all friends of a user
+        Input:      JSON with username
+        Output:     JSON with list of users
+        '''
+        try:
+            friends = [self._public_user(record.data()["u"]) for record in await self.qm.get_friends(json)]
+            return {"success": True, "message": "Friends retrieved successfully", "data": friends}
+        except Exception as e:
+            return {"success": False, "message": str(e)}
+
+    def _public_user(self, user):
+        '''
+        Function:   Strips private fields from a User node and converts neo4j types
+        Input:      dict of User node properties
+        Output:     dict of User node properties
+        '''
+        user.pop("password", None)
+        if isinstance(user.get("birth_date"), (neo4j.time.Date, neo4j.time.DateTime)):
+            user["birth_date"] = user["birth_date"].to_native()
+        return user
+
+    async def get_user_interests(self, json):
         '''
         Function:   Gets list of user interest based on a hardcoded threshold for model to recommend
         Input:      JSON with username
-        Output:     JSON with list of interest
+        Output:     JSON with list of interest and their INTERESTED_IN weightages in the same order
         '''
         try:
             json["threshold"] = 0.5
-            data = [i.data()["topic"] for i in self.qm.get_user_interests(json)]
-            return {"success": True, "data": data}
+            records = [i.data() for i in await self.qm.get_user_interests(json)]
+            return {"success": True, "data": [r["topic"] for r in records], "weights": [r["weightage"] for r in records]}
         except Exception as e:
             return {"success": False, "message": str(e)}
 
-    def attempt_login(self, json):
+    async def get_password_hash(self, json):
         '''
-        Function:   Attempts login using a username and password
-        Input:      JSON with username and password (hashed)
-        Output:     JSON with success (boolean)
+        Function:   Gets the stored password hash of a user so that login can verify against it
+        Input:      JSON with username
+        Output:     JSON with success (boolean) and password (hashed)
         '''
         try:
-            res = self.qm.attempt_login(json)
-            return {"success": len(res) > 0}
+            res = await self.qm.get_password_hash(json)
+            if len(res) == 0:
+                return {"success": False, "message": "Invalid username or password."}
+            return {"success": True, "password": res[0].data()["password"]}
         except Exception as e:
-            logger.error(f"Error attempting login: {e}")
             return {"success": False, "message": str(e)}
     
-    def get_random_users(self):
+    async def get_random_users(self, n=4):
         '''
-        Function:   Gets 4 random users
-        Input:      None
-        Output:     JSON with 4 random users
+        Function:   Gets n random users, sampled server-side from the indexed rand property
+        Input:      n (int)
+        Output:     JSON with up to n random users
         '''
         try:
-            users = [i.data()['username'] for i in self.qm.get_usernames()]
-            indices = set()
-            max_loop = 1000
-            for _ in range(max_loop):
-                if len(indices) >= 4: break
-                indices.add(random.randint(0, len(users) - 1))
-            
-            userdata = [self.qm.get_user({'username': users[i]})[0].data()['u'] for i in indices]
-            
-            for ud in userdata:
-                ud.pop("password", None)
-            return {"success": True, "data": {"users": [userdata[i] for i in indices]}}
+            seeds = [random.random() for _ in range(n * 2)]
+            userdata = [self._public_user(i.data()['u']) for i in await self.qm.get_random_users({'seeds': seeds, 'limit': n})]
+            return {"success": True, "data": {"users": userdata}}
         except Exception as e:
             return {"success": False, "message": str(e)}
 
-    def create_friendship(self, json):
+    async def create_friendship(self, json):
         '''
         Function:   Makes two users friends
         Input:      JSON with username1 and username2
         Output:     None
         '''
         try:
-            self.qm.create_friendship(json)
+            await self.qm.create_friendship(json)
             return {"success": True, "message": "Friend added successfully."}
         except Exception as e:
             return {"success": False, "message": str(e)}
 
-    def delete_friendship(self, json: dict) -> dict:
+    async def delete_friendship(self, json: dict) -> dict:
         '''
         Function:   Makes two users no longer friends
         Input:      JSON with username1 and username2
         Output:     None
         '''
         try:
-            self.qm.delete_friendship(json)
+            await self.qm.delete_friendship(json)
             return {"success": True, "message":"Friend removed successfully."}
         except Exception as e:
             return {"success": False, "message": str(e)}
 
     ## EVENT METHODS
 
-    def create_or_update_event(self, json):
+    async def create_or_update_event(self, json):
         '''
         Function:   Creates an event if its eventid does not yet exist, else update the event
         Input:      JSON with eventid, name, description, url, logo, starttime_local, endtime_local, is_free, 
                     is_online, category, venue_address, venue_lat, venue_long, venue_region,
-                    organizer_name, organizer_website
+                    organizer_name, organizer_website, optionally content_hash, embed_hash, changed
         Output:     None
         '''
         try:
-            self.qm.create_or_update_event(json)
-            self.qm.create_event_to_topic(json)
-            self.qm.create_event_to_type(json)
+            json = {"content_hash": None, "embed_hash": None, "changed": None, **json}
+            await self.qm.create_or_update_event(json)
+            await self.qm.create_event_to_topic(json)
+            await self.qm.create_event_to_type(json)
 
             return {"success": True, "message": "Event changed successfully."}
         except Exception as e:
             return {"success": False, "message": str(e)}
 
-    def get_events(self):
+    async def get_event_hashes(self, json):
+        '''
+        Function:   Gets the stored hashes of events to detect which scraped events changed
+        Input:      JSON with eventids (list)
+        Output:     JSON with hashes (dict of eventid to dict with content_hash and embed_hash), unknown eventids are left out
+        '''
+        try:
+            hashes = {record["eventid"]: record.data() for record in await self.qm.get_event_hashes(json)}
+            return {"success": True, "hashes": hashes}
+        except Exception as e:
+            return {"success": False, "message": str(e)}
+
+    async def set_event_embed_hashes(self, json):
         '''
-        Function:   Get events 
-        Input:      None
-        Output:     JSON of events (list of dict)
+        Function:   Records which version of each event is stored in the vector db
+        Input:      JSON with events (list of dict with eventid and embed_hash)
+        Output:     None
         '''
         try:
-            data = [event.data() for event in self.qm.get_events()]
-            for event in data:
-                event['e']['type'] = event['type']
-                event['e']['category'] = event['topic']
-            return {"success": True, "message": "Events retrieved successfully.", "events": [event['e'] for event in data]}
+            await self.qm.set_event_embed_hashes(json)
+            return {"success": True, "message": "Embed hashes updated successfully."}
+        except Exception as e:
+            return {"success": False, "message": str(e)}
+
+    async def expire_events(self, json):
+        '''
+        Function:   Soft-expires events that have ended, expired events are left out of event listings
+        Input:      JSON with now (local time string, e.g. 2025-03-01T19:00:00)
+        Output:     JSON with number of events expired
+        '''
+        try:
+            res = await self.qm.expire_events(json)
+            return {"success": True, "expired": res[0].data()["expired"]}
+        except Exception as e:
+            return {"success": False, "message": str(e)}
+
+    def _public_event(self, record):
+        '''
+        Function:   Flattens an event record into its Event node properties
+        Input:      dict with e (Event node properties), topic and type
+        Output:     dict of Event node properties with type and category
+        '''
+        event = record['e']
+        # neo4j points are not JSON serializable, venue_lat and venue_long hold the same coordinates
+        event.pop('location', None)
+        event['type'] = record['type']
+        event['category'] = record['topic']
+        return event
+
+    async def get_events(self, limit=50, cursor=None):
+        '''
+        Function:   Get a page of events, soonest first
+        Input:      limit (int), cursor (str from next_cursor of the previous page or None for the first page)
+        Output:     JSON of events (list of dict) and next_cursor (None on the last page)
+        '''
+        try:
+            starttime, eventid = decode_cursor(cursor, 2)
+            data = [event.data() for event in await self.qm.get_events({
+                'starttime': starttime, 'eventid': eventid, 'limit': limit + 1
+            })]
+            events = [self._public_event(event) for event in data[:limit]]
+            next_cursor = encode_cursor(events[-1]['starttime_local'], events[-1]['eventid']) if len(data) > limit else None
+            return {"success": True, "message": "Events retrieved successfully.", "events": events, "next_cursor": next_cursor}
         except Exception as e:
             return {"success": False, "message": str(e)}
     
-    def get_random_events(self):
+    async def get_events_by_ids(self, json):
         '''
-        Function:   Gets 5 random events
-        Input:      None
-        Output:     JSON of events
+        Function:   Get many events by eventid in one query
+        Input:      JSON with eventids (list)
+        Output:     JSON of events (list of dict) in the same order as eventids, unknown eventids are skipped
         '''
         try:
-            events = self.get_events()["events"]
-            indices = set()
-            max_loop = 1000
-            for _ in range(max_loop):
-                if len(indices) >= 5: break
-                indices.add(random.randint(0, len(events) - 1))
-            return {'success': True, 'data': {'events': [events[i] for i in indices]}}
+            data = [event.data() for event in await self.qm.get_events_by_ids(json)]
+            return {"success": True, "message": "Events retrieved successfully.", "events": [self._public_event(event) for event in data]}
+        except Exception as e:
+            return {"success": False, "message": str(e)}
+    
+    async def get_random_events(self, n=5):
+        '''
+        Function:   Gets n random events, sampled server-side from the indexed rand property
+        Input:      n (int)
+        Output:     JSON of up to n events
+        '''
+        try:
+            seeds = [random.random() for _ in range(n * 2)]
+            data = [event.data() for event in await self.qm.get_random_events({'seeds': seeds, 'limit': n})]
+            return {'success': True, 'data': {'events': [self._public_event(event) for event in data]}}
         except Exception as e: 
             return {"success": False, "message": str(e)}
 
+    async def get_events_near(self, json):
+        '''
+        Function:   Gets events within a radius of a position, nearest first
+        Input:      JSON with latitude, longitude, radius_km and limit
+        Output:     JSON of events (list of dict) each with distance_km
+        '''
+        try:
+            params = {
+                'latitude': float(json['latitude']),
+                'longitude': float(json['longitude']),
+                'radius': float(json['radius_km']) * 1000,
+                'limit': int(json['limit']),
+            }
+            events = []
+            for record in await self.qm.get_events_near(params):
+                record = record.data()
+                event = self._public_event(record)
+                event['distance_km'] = record['distance'] / 1000
+                events.append(event)
+            return {"success": True, "message": "Events retrieved successfully.", "events": events}
+        except Exception as e:
+            return {"success": False, "message": str(e)}
+
+    async def get_events_within(self, json):
+        '''
+        Function:   Gets the markers of the events map inside a viewport (min_lat, min_long, max_lat, max_long)
+                    or a circle (latitude, longitude, radius_km), optionally within a time window and categories.
+                    Below the cluster zoom, events are grouped into grid cells of about a quarter of a map tile
+        Input:      JSON with the viewport or circle, start, end (local ISO datetime strings or None),
+                    categories (list of string or None), zoom (int) and limit (int)
+        Output:     JSON with clustered (boolean) and either clusters (list of dict with count, latitude, longitude
+                    and eventid of one event in the cluster) or events (list of dict of marker fields)
+        '''
+        try:
+            params = {
+                'start': json.get('start'),
+                'end': json.get('end'),
+                'categories': json.get('categories') or None,
+                'limit': int(json['limit']),
+                'latitude': None,
+                'longitude': None,
+                'radius': None,
+            }
+            if json.get('radius_km') is not None:
+                latitude, longitude, radius_km = float(json['latitude']), float(json['longitude']), float(json['radius_km'])
+                # the circle's bounding box lets the point index do the seek, the distance check trims its corners
+                lat_delta = radius_km / 111.32
+                long_delta = radius_km / (111.32 * max(math.cos(math.radians(latitude)), 1e-6))
+                params.update({
+                    'latitude': latitude, 'longitude': longitude, 'radius': radius_km * 1000,
+                    'min_lat': latitude - lat_delta, 'max_lat': latitude + lat_delta,
+                    'min_long': longitude - long_delta, 'max_long': longitude + long_delta,
+                })
+            else:
+                params.update({key: float(json[key]) for key in ('min_lat', 'min_long', 'max_lat', 'max_long')})
+
+            zoom = int(json['zoom'])
+            if zoom < int(os.getenv("EVENT_MAP_CLUSTER_ZOOM", 14)):
+                params['cell'] = 360 / 2 ** zoom / 4
+                clusters = [record.data() for record in await self.qm.get_event_clusters_within(params)]
+                return {"success": True, "message": "Event clusters retrieved successfully.", "clustered": True, "clusters": clusters}
+            events = [record.data() for record in await self.qm.get_events_within(params)]
+            return {"success": True, "message": "Events retrieved successfully.", "clustered": False, "events": events}
+        except Exception as e:
+            return {"success": False, "message": str(e)}
+
     ## THREADS
 
-    def create_thread(self, json):
+    async def create_thread(self, json):
         '''
         Function:   Create a new thread
         Input:      JSON with title username description code interest (list of string)
-        Output:     None
+        Output:     JSON with threadid of the new thread
         '''
         try:
-            json['datetime'] = datetime.datetime.now()
-            self.qm.create_thread(json)
-            self.qm.create_thread_to_user(json)
-            for interest in json['interests']:
-                self.qm.create_thread_to_topic({
-                    'title': json['title'], 
-                    'topic': interest
-                })
-            return {"success": True, "message": "Thread created successfully."}
+            now = datetime.datetime.now(datetime.timezone.utc)
+            # datetime stays naive local time like existing threads, activity is epoch seconds in UTC
+            json['datetime'] = now.astimezone().replace(tzinfo=None)
+            json['activity'] = now.timestamp()
+            threads = [thread.data() for thread in await self.qm.create_thread(json)]
+            if not threads:
+                return {"success": False, "message": "User does not exist."}
+            await self.qm.update_thread_feeds({
+                'threadid': threads[0]['threadid'], 'size': self.feed_size, 'tau': self.feed_tau
+            })
+            return {"success": True, "message": "Thread created successfully.", "threadid": threads[0]['threadid']}
         except Exception as e:
             return {"success": False, "message": str(e)}
     
-    def create_comment(self, json):
+    async def create_comment(self, json):
         '''
         Function:   Create comments for thread
-        Input:      JSON with title, username, description
+        Input:      JSON with threadid, username, description
         Output:     None
         '''
         try:
-            json['datetime'] = datetime.datetime.now()
-            self.qm.create_comment(json)
+            now = datetime.datetime.now(datetime.timezone.utc)
+            # datetime stays naive local time like existing threads, activity is epoch seconds in UTC
+            json['datetime'] = now.astimezone().replace(tzinfo=None)
+            json['activity'] = now.timestamp()
+            await self.qm.create_comment(json)
+            await self.qm.update_thread_feeds({
+                'threadid': json['threadid'], 'size': self.feed_size, 'tau': self.feed_tau
+            })
             return {"success": True, "message": "Comment created successfully."}
         except Exception as e:
             return {"success": False, "message": str(e)}
 
-    def get_thread(self, json):
+    async def get_comments(self, json):
         '''
-        Function:   Gets details of one thread
-        Input:      JSON with title
-        Output:     JSON with stuff
+        Function:   Gets a page of comments of a thread, oldest first
+        Input:      JSON with threadid, limit (int) and cursor (str from next_cursor of the previous page or None)
+        Output:     JSON with comments (list of dict) and next_cursor (None on the last page)
         '''
         try:
-            threads = [thread.data() for thread in self.qm.get_thread(json)]
-            comments = [comment.data() for comment in self.qm.get_comments_from_thread(json)]
-            topics = [topic.data() for topic in self.qm.get_topics_from_thread(json)]
+            limit = int(json.get('limit') or 20)
+            comment_datetime, commentid = decode_cursor(json.get('cursor'), 2)
+            data = [comment.data() for comment in await self.qm.get_comments_from_thread({
+                'threadid': json['threadid'],
+                'datetime': datetime.datetime.fromisoformat(comment_datetime) if comment_datetime else None,
+                'commentid': commentid,
+                'limit': limit + 1
+            })]
+            comments = []
+            for i in data[:limit]:
+                comment = i['c']
+                comment['username'] = i['username']
+                comment['datetime'] = comment['datetime'].to_native()
+                comments.append(comment)
+            next_cursor = encode_cursor(comments[-1]['datetime'], comments[-1]['commentid']) if len(data) > limit else None
+            return {'success': True, 'comments': comments, 'next_cursor': next_cursor}
+        except Exception as e:
+            return {"success": False, "message": str(e)}
+
+    async def get_thread(self, json):
+        '''
+        Function:   Gets details of one thread with its creator, interests and first page of comments in one query
+        Input:      JSON with threadid and optionally limit (int) of comments
+        Output:     JSON with thread, whose next_comments_cursor continues the comments with get_comments
+        '''
+        try:
+            limit = int(json.get('limit') or 20)
+            threads = [thread.data() for thread in await self.qm.get_thread({'threadid': json['threadid'], 'limit': limit + 1})]
+            if not threads:
+                return {"success": False, "message": "Thread does not exist."}
 
             output = threads[0]['th']
             output['datetime'] = output['datetime'].to_native()
             output['username'] = threads[0]['username']
-            output['comments'] = []
-            for i in comments:
-                comment = i['c']
-                comment['username'] = i['username']
+            output['interests'] = threads[0]['interests']
+            output['comments'] = threads[0]['comments'][:limit]
+            for comment in output['comments']:
                 comment['datetime'] = comment['datetime'].to_native()
-                output['comments'].append(comment)
-            
-            output['interests'] = []
-            for i in topics:
-                output['interests'].append(i['name'])
+            output['next_comments_cursor'] = encode_cursor(
+                output['comments'][-1]['datetime'], output['comments'][-1]['commentid']
+            ) if len(threads[0]['comments']) > limit else None
 
             return {'success': True, 'comment': 'Thread retrieved successfully', 'thread': output}
         except Exception as e:
             return {"success": False, "message": str(e)}
         
 
-    def get_threads(self):
+    async def get_threads(self, limit=20, cursor=None):
+        '''
+        Function:   Gets a page of threads and their creator, newest first
+        Input:      limit (int), cursor (str from next_cursor of the previous page or None for the first page)
+        Output:     JSON with threads which is a list of dict with threadid, title, datetime and username,
+                    and next_cursor (None on the last page)
+        '''
+        try:
+            thread_datetime, threadid = decode_cursor(cursor, 2)
+            data = [thread.data() for thread in await self.qm.get_threads({
+                'datetime': datetime.datetime.fromisoformat(thread_datetime) if thread_datetime else None,
+                'threadid': threadid,
+                'limit': limit + 1
+            })]
+            threads = data[:limit]
+            for thread in threads:
+                thread['datetime'] = thread['datetime'].to_native()
+            next_cursor = encode_cursor(threads[-1]['datetime'], threads[-1]['threadid']) if len(data) > limit else None
+            return {'success': True, 'comment': 'Threads retrieved successfully', 'threads': threads, 'next_cursor': next_cursor}
+        except Exception as e:
+            return {"success": False, "message": str(e)}
+
+    ## FORUM FEED
+
+    async def rebuild_feed(self, json):
         '''
-        Function:   Gets all threads and their creator
-        Input:      None
-        Output:     JSON with threads which is a list of dict with title and username
+        Function:   Recomputes a user's forum feed from scratch, for new users and changed interests
+        Input:      JSON with username
+        Output:     JSON with items (int) in the feed
         '''
         try:
-            data = [thread.data() for thread in self.qm.get_threads()]
-            return {'success': True, 'comment': 'Threads retrieved successfully', 'threads': data}
+            data = [record.data() for record in await self.qm.rebuild_user_feed({
+                'username': json['username'], 'size': self.feed_size, 'tau': self.feed_tau
+            })]
+            return {"success": True, "message": "Feed rebuilt successfully.", "items": data[0]['items'] if data else 0}
+        except Exception as e:
+            return {"success": False, "message": str(e)}
+
+    async def get_feed(self, json):
+        '''
+        Function:   Gets a page of a user's forum feed, threads ranked by the overlap of their topics with the
+                    user's interests and by recent activity. Users with an empty feed get the most recent threads.
+                    The feed of a user that never had one built (created before feeds existed) is built first
+        Input:      JSON with username, limit (int) and cursor (str from next_cursor of the previous page or None)
+        Output:     JSON with threads (list of dict with threadid, title, datetime and username), source
+                    ("feed" or "recent") and next_cursor (None on the last page)
+        '''
+        try:
+            limit = int(json.get('limit') or 20)
+            cursor = json.get('cursor')
+            try:
+                kind, score, threadid = decode_cursor(cursor, 3)
+            except ValueError:
+                kind = 'recent'
+            if cursor and kind != 'feed':
+                res = await self.get_threads(limit, cursor)
+                return {**res, 'source': 'recent'}
+            if not cursor:
+                built = [record.data() for record in await self.qm.get_feed_built({'username': json['username']})]
+                if built and not built[0]['built']:
+                    res = await self.rebuild_feed({'username': json['username']})
+                    if not res['success']:
+                        return res
+
+            data = [thread.data() for thread in await self.qm.get_feed({
+                'username': json['username'], 'score': score, 'threadid': threadid, 'limit': limit + 1
+            })]
+            if not data and not cursor:
+                res = await self.get_threads(limit)
+                return {**res, 'source': 'recent'}
+            threads = data[:limit]
+            for thread in threads:
+                thread['datetime'] = thread['datetime'].to_native()
+            next_cursor = encode_cursor('feed', threads[-1]['score'], threads[-1]['threadid']) if len(data) > limit else None
+            return {'success': True, 'comment': 'Feed retrieved successfully', 'threads': threads, 'source': 'feed', 'next_cursor': next_cursor}
         except Exception as e:
             return {"success": False, "message": str(e)}
 
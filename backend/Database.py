@@ -1,17 +1,80 @@
-from neo4j import GraphDatabase
+from neo4j import GraphDatabase, AsyncGraphDatabase, RoutingControl
+from dotenv import load_dotenv
+import os
+
+# Load environment variables
+load_dotenv()
+
+def driver_config():
+    '''
+    Connection settings shared by the sync and async drivers, read from the environment
+    '''
+    return {
+        'url': os.getenv('NEO4J_URI', 'neo4j://127.0.0.1'),
+        'auth': (os.getenv('NEO4J_USERNAME', 'neo4j'), os.getenv('NEO4J_PASSWORD', 'P@ssword1')),
+        'database': os.getenv('NEO4J_DATABASE', 'neo4j'),
+        'options': {
+            'max_connection_pool_size': int(os.getenv('NEO4J_MAX_POOL_SIZE', 100)),
+            'connection_acquisition_timeout': float(os.getenv('NEO4J_CONNECTION_ACQUISITION_TIMEOUT', 60)),
+            'max_connection_lifetime': float(os.getenv('NEO4J_MAX_CONNECTION_LIFETIME', 3600)),
+        }
+    }
 
 class Database:
     '''
     Database handles interaction with the Neo4j database
     '''
     def __init__(self):
-        self.URL = 'neo4j://127.0.0.1'
-        self.AUTH = ('neo4j', 'P@ssword1')
-        self.driver = GraphDatabase.driver(self.URL, auth = self.AUTH)
+        config = driver_config()
+        self.URL = config['url']
+        self.AUTH = config['auth']
+        self.DATABASE = config['database']
+        self.driver = GraphDatabase.driver(self.URL, auth = self.AUTH, **config['options'])
     
-    def execute_query(self, query, params):
-        records, summary, keys = self.driver.execute_query(query, parameters_=params, database_="neo4j")
+    def execute_query(self, query, params, read=False):
+        '''
+        read=True routes the query to a follower/read replica when running against a cluster
+        '''
+        records, summary, keys = self.driver.execute_query(
+            query, parameters_=params, database_=self.DATABASE,
+            routing_=RoutingControl.READ if read else RoutingControl.WRITE
+        )
         return records
 
+    def close(self):
+        self.driver.close()
+
+class AsyncDatabase:
+    '''
+    AsyncDatabase handles interaction with the Neo4j database without blocking the event loop
+    '''
+    def __init__(self):
+        config = driver_config()
+        self.URL = config['url']
+        self.AUTH = config['auth']
+        self.DATABASE = config['database']
+        self.driver = AsyncGraphDatabase.driver(self.URL, auth = self.AUTH, **config['options'])
+
+    async def execute_query(self, query, params, read=False):
+        '''
+        read=True routes the query to a follower/read replica when running against a cluster
+        '''
+        records, summary, keys = await self.driver.execute_query(
+            query, parameters_=params, database_=self.DATABASE,
+            routing_=RoutingControl.READ if read else RoutingControl.WRITE
+        )
+        return records
+
+    async def execute_auto_commit(self, query, params):
+        '''
+        Runs the query in an auto-commit transaction, which CALL { ... } IN TRANSACTIONS requires
+        '''
+        async with self.driver.session(database=self.DATABASE) as session:
+            result = await session.run(query, params)
+            return await result.consume()
+
+    async def close(self):
+        await self.driver.close()
+
 if __name__ == "__main__":
-    db = Database()
\ No newline at end of file
+    db = Database()
@@ -0,0 +1,206 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from EventsScrapper import discover_event_ids
+
+_DONE = object()
+
+class EventPipeline:
+    """
+    Streams events from discovery to the graph and vector dbs through bounded queues:
+
+        discover -> fetch details -> enrich region -> write graph -> embed
+
+    Every stage has its own number of workers and blocks when the next stage's queue is full, so a slow
+    stage throttles the ones before it instead of buffering the whole run in memory. Event IDs that finished
+    the pipeline are appended to a checkpoint file, a restarted run skips them; the file is removed once a
+    run completes.
+
+    Discovery normally stops paging a facet at the first page of already known events. Every full_crawl_hours
+    it crawls every page instead, so that edits to known events that only appear on later pages are picked up.
+    """
+    def __init__(self, em, db, region_fn, embed_fn, checkpoint_path=None):
+        """
+        Params:
+            - em: EventManager to fetch event details with
+            - db: DBController to write events to
+            - region_fn: function (lat, long) -> region name
+            - embed_fn: async function (list of events) -> bool, stores the events in the vector db
+        """
+        DIR = os.path.dirname(os.path.abspath(__file__))
+        self.em = em
+        self.db = db
+        self.region_fn = region_fn
+        self.embed_fn = embed_fn
+        self.checkpoint_path = checkpoint_path or os.getenv("EVENT_PIPELINE_CHECKPOINT", os.path.join(DIR, "event_sync.checkpoint"))
+        self.queue_size = int(os.getenv("EVENT_PIPELINE_QUEUE_SIZE", 64))
+        self.fetch_workers = int(os.getenv("EVENT_PIPELINE_FETCH_WORKERS", 8))
+        self.enrich_workers = int(os.getenv("EVENT_PIPELINE_ENRICH_WORKERS", 1))
+        self.write_workers = int(os.getenv("EVENT_PIPELINE_WRITE_WORKERS", 4))
+        self.embed_batch_size = int(os.getenv("EVENT_PIPELINE_EMBED_BATCH_SIZE", 16))
+        self.timezone = ZoneInfo(os.getenv("EVENT_TIMEZONE", "Asia/Singapore"))
+        self.full_crawl_seconds = float(os.getenv("EVENT_PIPELINE_FULL_CRAWL_HOURS", 24)) * 3600
+        self.last_full_crawl = None
+
+    def _load_checkpoint(self):
+        if not os.path.exists(self.checkpoint_path):
+            return set()
+        with open(self.checkpoint_path) as f:
+            return {line.strip() for line in f if line.strip()}
+
+    def _checkpoint(self, eventids):
+        with open(self.checkpoint_path, "a") as f:
+            f.writelines(f"{eventid}\n" for eventid in eventids)
+
+    async def _stage(self, name, fn, inbox, outbox, workers, downstream_workers):
+        """
+        Runs workers that apply fn to items of inbox until they each get a _DONE, results that are not None
+        go to outbox, then signals _DONE to each downstream worker.
+        """
+        async def worker():
+            while True:
+                item = await inbox.get()
+                if item is _DONE:
+                    return
+                try:
+                    result = await fn(item)
+                except Exception as e:
+                    eventid = item.get('eventid') if isinstance(item, dict) else item
+                    logging.error(f"Event pipeline {name} failed for {eventid}: {e}")
+                    self.stats['failed'] += 1
+                    continue
+                if result is not None and outbox is not None:
+                    await outbox.put(result)
+
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        if outbox is not None:
+            for _ in range(downstream_workers):
+                await outbox.put(_DONE)
+
+    def _full_crawl_due(self):
+        return self.last_full_crawl is None or time.monotonic() - self.last_full_crawl >= self.full_crawl_seconds
+
+    async def _discover(self, outbox, done):
+        try:
+            full_crawl = self._full_crawl_due()
+            eventids = await discover_event_ids(known_ids=frozenset() if full_crawl else self.em.known_event_ids)
+            if full_crawl:
+                self.last_full_crawl = time.monotonic()
+                self.stats['full_crawl'] = True
+            self.em.known_event_ids.update(eventids)
+            for eventid in eventids:
+                self.stats['discovered'] += 1
+                if eventid in done:
+                    self.stats['resumed'] += 1
+                    continue
+                await outbox.put(eventid)
+        finally:
+            for _ in range(self.fetch_workers):
+                await outbox.put(_DONE)
+
+    async def _fetch(self, eventid):
+        event = await self.em.get_event_details(eventid)
+        if event is None:
+            self.stats['failed'] += 1
+        return event
+
+    async def _enrich(self, event):
+        event['venue_region'] = self.region_fn(event.get('venue_lat'), event.get('venue_long'))
+        event['type'] = 'Networking'  # how should we extract event type
+        return event
+
+    async def _write(self, event):
+        """
+        Writes new or changed events and passes on events that need embedding. The stored embed_hash is only
+        updated once embedding succeeded, so an event whose embedding was interrupted is embedded next run.
+        """
+        known = await self.db.get_event_hashes({'eventids': [event['eventid']]})
+        if not known['success']:
+            raise Exception(known['message'])
+        previous = known['hashes'].get(event['eventid']) or {'content_hash': None, 'embed_hash': None}
+        if previous['content_hash'] == event['content_hash']:
+            self.stats['unchanged'] += 1
+        else:
+            res = await self.db.create_or_update_event({**event, 'embed_hash': previous['embed_hash']})
+            if not res['success']:
+                raise Exception(res['message'])
+            self.stats['written'] += 1
+        if previous['embed_hash'] == event['embed_hash']:
+            self._checkpoint([event['eventid']])
+            return None
+        return event
+
+    async def _embed(self, inbox):
+        """
+        Embeds events in batches of embed_batch_size, the last batch of the run may be smaller.
+        """
+        batch = []
+        finished = False
+        while not finished:
+            item = await inbox.get()
+            if item is _DONE:
+                finished = True
+            else:
+                batch.append(item)
+            if batch and (len(batch) >= self.embed_batch_size or finished):
+                if await self.embed_fn(batch):
+                    res = await self.db.set_event_embed_hashes({
+                        'events': [{'eventid': event['eventid'], 'embed_hash': event['embed_hash']} for event in batch]
+                    })
+                    if not res['success']:
+                        logging.error(f"Failed to record embedded events: {res['message']}")
+                    self.stats['embedded'] += len(batch)
+                    self._checkpoint([event['eventid'] for event in batch])
+                else:
+                    self.stats['failed'] += len(batch)
+                batch = []
+
+    async def _run_stages(self, *stages):
+        """
+        Runs the stages concurrently. If one raises, the others are cancelled (they would otherwise block
+        forever on a queue nobody reads or fills) and the exception is re-raised.
+        """
+        tasks = [asyncio.ensure_future(stage) for stage in stages]
+        try:
+            finished, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in finished:
+                if task.exception() is not None:
+                    raise task.exception()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def run(self):
+        """
+        Function:   Runs the pipeline once, resuming from the checkpoint of an interrupted run
+        Input:      None
+        Output:     stats: json
+        """
+        self.stats = {
+            'discovered': 0, 'resumed': 0, 'written': 0, 'unchanged': 0,
+            'embedded': 0, 'failed': 0, 'expired': 0, 'full_crawl': False
+        }
+        # get() only hides expired venue/organizer/category rows, delete them once per sync
+        self.stats['purged_references'] = self.em.reference_cache.purge_expired()
+        done = self._load_checkpoint()
+        ids, details, enriched, written = (asyncio.Queue(self.queue_size) for _ in range(4))
+        await self._run_stages(
+            self._discover(ids, done),
+            self._stage('fetch', self._fetch, ids, details, self.fetch_workers, self.enrich_workers),
+            self._stage('enrich', self._enrich, details, enriched, self.enrich_workers, self.write_workers),
+            self._stage('write', self._write, enriched, written, self.write_workers, 1),
+            self._embed(written),
+        )
+
+        now = datetime.now(self.timezone)
+        res = await self.db.expire_events({'now': now.strftime('%Y-%m-%dT%H:%M:%S')})
+        if res['success']:
+            self.stats['expired'] = res['expired']
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+        return self.stats
@@ -1,53 +1,166 @@
-import requests
+import asyncio
+import hashlib
+import httpx
 import json
 import os
 import logging
+import time
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
 from dotenv import load_dotenv
 
-from EventsScrapper import extract_eventbrite_event_ids
+from EventsScrapper import discover_event_ids
+from ReferenceCache import ReferenceCache
 
 # Load environment variables
 load_dotenv()
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+# Event fields the vector service embeds, a change in any other field does not need a re-embed
+EMBEDDED_FIELDS = ("name", "description", "category")
+
+def event_hash(event, fields=None):
+    """
+    Hash of the event's content (or only of fields), used to skip writing/re-embedding unchanged events.
+    """
+    if fields is None:
+        fields = [field for field in event if field not in ("content_hash", "embed_hash", "changed")]
+    content = {field: event.get(field) for field in fields}
+    return hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+def retry_after_seconds(value, default):
+    """
+    Seconds to wait from a Retry-After header, which is either a number of seconds or an HTTP-date.
+    Falls back to default when the header is missing or malformed.
+    """
+    if value is None:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+class RateLimiter:
+    """
+    Token bucket shared by every request to one host. pause() blocks all requests to the host,
+    e.g. for the Retry-After of a 429 response.
+    """
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
 
 class EventManager:
     BASE_URL = "https://www.eventbriteapi.com/v3"
-    
-    def __init__(self):
+
+    def __init__(self, base_url=None):
+        self.base_url = base_url or os.getenv("EVENTBRITE_BASE_URL", self.BASE_URL)
         self.api_key = os.getenv("EVENTBRITE_API_KEY")
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Accept": "application/json"
         }
+        # Eventbrite allows 2000 calls per hour per token, a small burst keeps a cold start from spending
+        # the whole hour's budget at once and running into that limit
+        self.rate_per_hour = float(os.getenv("EVENTBRITE_RATE_PER_HOUR", 2000))
+        self.burst = float(os.getenv("EVENTBRITE_BURST", 20))
+        self.concurrency = int(os.getenv("EVENTBRITE_CONCURRENCY", 8))
+        self.max_retries = int(os.getenv("EVENTBRITE_MAX_RETRIES", 3))
+        self.limiters = {}
+        self.semaphore = None
+        self.client = None
+        self.reference_cache = ReferenceCache()
+        self.reference_in_flight = {}
+        # event IDs seen by previous runs, discovery stops paging once a page only has these
+        self.known_event_ids = set()
 
-    def _make_request(self, endpoint):
-        """Generic method for making API GET requests with error handling."""
-        url = f"{self.BASE_URL}/{endpoint}"
-        try:
-            response = requests.get(url, headers=self.headers, timeout=10)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            logging.error(f"API request failed: {e}")
-            return {}
+    def _limiter(self, url):
+        host = urlsplit(url).netloc
+        if host not in self.limiters:
+            self.limiters[host] = RateLimiter(self.rate_per_hour / 3600, self.burst)
+        return self.limiters[host]
+
+    def _client(self):
+        if self.client is None:
+            self.client = httpx.AsyncClient(
+                headers=self.headers,
+                timeout=httpx.Timeout(10, connect=5),
+                limits=httpx.Limits(max_connections=self.concurrency),
+            )
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+        return self.client
+
+    async def _make_request(self, endpoint):
+        """Generic method for making API GET requests with error handling, rate limiting and 429 retries."""
+        url = f"{self.base_url}/{endpoint}"
+        client = self._client()
+        limiter = self._limiter(url)
+        for attempt in range(self.max_retries + 1):
+            await limiter.acquire()
+            try:
+                async with self.semaphore:
+                    response = await client.get(url)
+                if response.status_code == 429 and attempt < self.max_retries:
+                    retry_after = retry_after_seconds(response.headers.get("Retry-After"), 2 ** attempt)
+                    logging.warning(f"Rate limited by {urlsplit(url).netloc}, retrying in {retry_after}s")
+                    limiter.pause(retry_after)
+                    continue
+                response.raise_for_status()
+                return response.json()
+            except (httpx.HTTPError, json.JSONDecodeError) as e:
+                logging.error(f"API request failed: {e!r}")
+                return {}
+        return {}
 
-    def get_event_details(self, event_id):
-        event_data = self._make_request(f"events/{event_id}")
+    async def get_event_details(self, event_id):
+        event_data = await self._make_request(f"events/{event_id}")
         if not event_data:
             return None
-        
-        venue = self.get_venue_details(event_data.get("venue_id"))
-        organizer = self.get_organizer_details(event_data.get("organizer_id"))
-        category = self.get_category_name(event_data.get("category_id"))
-        
-        return {
+
+        venue, organizer, category = await asyncio.gather(
+            self.get_venue_details(event_data.get("venue_id")),
+            self.get_organizer_details(event_data.get("organizer_id")),
+            self.get_category_name(event_data.get("category_id")),
+        )
+
+        event_details = {
             "eventid": event_id,
             "name": event_data.get("name", {}).get("text"),
             "description": event_data.get("description", {}).get("text"),
             "url": event_data.get("url"),
-            "logo": event_data.get("logo", {}).get("url"),
+            "logo": (event_data.get("logo") or {}).get("url"),
             "starttime_local": event_data.get("start", {}).get("local"),
             "endtime_local": event_data.get("end", {}).get("local"),
             "is_free": event_data.get("is_free", False),
@@ -59,23 +172,76 @@ class EventManager:
             "organizer_name": organizer.get("name"),
             "organizer_website": organizer.get("website")
         }
+        event_details["content_hash"] = event_hash(event_details)
+        event_details["embed_hash"] = event_hash(event_details, EMBEDDED_FIELDS)
+        event_details["changed"] = event_data.get("changed")
+        return event_details
+
+    async def _get_reference(self, entity_type, entity_id):
+        """
+        Gets venue/organizer/category data from the reference cache, or from the API on a miss.
+        Concurrent misses for the same entity share one request.
+        """
+        if not entity_id:
+            return {}
+        cached = self.reference_cache.get(entity_type, entity_id)
+        if cached is not None:
+            return cached
+
+        key = (entity_type, entity_id)
+        if key not in self.reference_in_flight:
+            self.reference_in_flight[key] = asyncio.ensure_future(self._make_request(f"{entity_type}/{entity_id}"))
+        try:
+            data = await asyncio.shield(self.reference_in_flight[key])
+        finally:
+            if key in self.reference_in_flight and self.reference_in_flight[key].done():
+                del self.reference_in_flight[key]
+        if data:
+            self.reference_cache.set(entity_type, entity_id, data)
+        return data
 
-    def get_venue_details(self, venue_id):
-        return self._make_request(f"venues/{venue_id}") if venue_id else {}
+    async def get_venue_details(self, venue_id):
+        return await self._get_reference("venues", venue_id)
 
-    def get_organizer_details(self, organizer_id):
-        return self._make_request(f"organizers/{organizer_id}") if organizer_id else {}
+    async def get_organizer_details(self, organizer_id):
+        return await self._get_reference("organizers", organizer_id)
 
-    def get_category_name(self, category_id):
-        category_data = self._make_request(f"categories/{category_id}")
+    async def get_category_name(self, category_id):
+        category_data = await self._get_reference("categories", category_id)
         return category_data.get("name")
 
-    def get_events(self):
-        event_ids = extract_eventbrite_event_ids()
-        
-        events_data = []
-        for event_id in event_ids:
-            event_details = self.get_event_details(event_id)
-            if event_details:  # Ensure event_details is not None
-                events_data.append(event_details)
-        return events_data
+    async def stream_events(self, event_ids=None):
+        """
+        Yields event details in the order of event_ids while fetching up to 2 * concurrency events ahead.
+        Events whose details could not be fetched are skipped.
+        """
+        if event_ids is None:
+            self.reference_cache.purge_expired()
+            event_ids = await discover_event_ids(known_ids=self.known_event_ids)
+            self.known_event_ids.update(event_ids)
+
+        window = 2 * self.concurrency
+        pending = deque()
+        try:
+            for event_id in event_ids:
+                pending.append(asyncio.create_task(self.get_event_details(event_id)))
+                if len(pending) >= window:
+                    event_details = await pending.popleft()
+                    if event_details:
+                        yield event_details
+            while pending:
+                event_details = await pending.popleft()
+                if event_details:
+                    yield event_details
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def get_events(self, event_ids=None):
+        return [event_details async for event_details in self.stream_events(event_ids)]
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+        self.reference_cache.close()
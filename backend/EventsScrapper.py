@@ -1,22 +1,114 @@
-import requests
+import abc
+import asyncio
+import httpx
+import logging
+import os
 import re
-from bs4 import BeautifulSoup
+
+HEADERS = {"User-Agent": "Mozilla/5.0"}
+
+def parse_eventbrite_event_ids(html):
+    """
+    Extracts event IDs from window.__SERVER_DATA__ of an Eventbrite listing page, in page order without duplicates.
+    """
+    return list(dict.fromkeys(re.findall(r'"eventbrite_event_id":"(\d+)"', html)))
+
+class EventSource(abc.ABC):
+    """
+    Base class for a website that events are discovered from. Subclasses list the listing pages to crawl
+    (facets, each paginated) and how to parse event IDs out of a page.
+    """
+    name = None
+
+    @abc.abstractmethod
+    def facets(self):
+        """Returns the listing URLs to crawl, each of which is paginated."""
+
+    @abc.abstractmethod
+    def page_url(self, facet_url, page):
+        """Returns the URL of a 1-based page of a facet."""
+
+    @abc.abstractmethod
+    def parse_event_ids(self, html):
+        """Returns the event IDs on a listing page, in page order without duplicates."""
+
+    async def fetch_page(self, client, url):
+        try:
+            response = await client.get(url)
+        except httpx.HTTPError as e:
+            logging.error(f"Request failed: {e!r}")
+            return None
+        if response.status_code != 200:
+            logging.error(f"Failed to fetch events page {url}: {response.status_code}")
+            return None
+        return response.text
+
+    async def crawl_facet(self, client, facet_url, known_ids, max_pages, page_concurrency):
+        """
+        Walks the pages of one facet, page_concurrency pages at a time. Stops at the first page that is
+        empty or fails, or that only has IDs in known_ids.
+        """
+        event_ids = []
+        for first_page in range(1, max_pages + 1, page_concurrency):
+            pages = range(first_page, min(first_page + page_concurrency, max_pages + 1))
+            htmls = await asyncio.gather(*(self.fetch_page(client, self.page_url(facet_url, page)) for page in pages))
+            for html in htmls:
+                page_ids = self.parse_event_ids(html) if html else []
+                if not page_ids:
+                    return event_ids
+                event_ids.extend(page_ids)
+                if known_ids and all(event_id in known_ids for event_id in page_ids):
+                    return event_ids
+        return event_ids
+
+    async def discover(self, client, known_ids=frozenset(), max_pages=50, page_concurrency=4):
+        """Crawls all facets concurrently and returns their event IDs in facet order without duplicates."""
+        results = await asyncio.gather(*(
+            self.crawl_facet(client, facet_url, known_ids, max_pages, page_concurrency) for facet_url in self.facets()
+        ))
+        return list(dict.fromkeys(event_id for event_ids in results for event_id in event_ids))
+
+class EventbriteSource(EventSource):
+    name = "eventbrite"
+    BASE_URL = "https://www.eventbrite.com/d/singapore--singapore"
+    CATEGORIES = [
+        "events",
+        "science-and-tech--events",
+        "business--events",
+        "hobbies--events",
+        "community--events",
+        "film-and-media--events",
+        "music--events",
+    ]
+
+    def __init__(self, base_url=None, categories=None):
+        self.base_url = base_url or os.getenv("EVENTBRITE_DISCOVERY_URL", self.BASE_URL)
+        self.categories = categories or self.CATEGORIES
+
+    def facets(self):
+        return [f"{self.base_url}/{category}/" for category in self.categories]
+
+    def page_url(self, facet_url, page):
+        return facet_url if page == 1 else f"{facet_url}?page={page}"
+
+    def parse_event_ids(self, html):
+        return parse_eventbrite_event_ids(html)
+
+async def discover_event_ids(sources=None, known_ids=frozenset(), client=None):
+    """
+    Discovers event IDs from every source concurrently, de-duplicated across sources.
+    A client can be passed in to reuse its connection pool, otherwise one is opened for this crawl.
+    """
+    sources = sources if sources is not None else [EventbriteSource()]
+    max_pages = int(os.getenv("DISCOVERY_MAX_PAGES", 50))
+    page_concurrency = int(os.getenv("DISCOVERY_PAGE_CONCURRENCY", 4))
+    if client is None:
+        async with httpx.AsyncClient(headers=HEADERS, timeout=10, follow_redirects=True) as client:
+            return await discover_event_ids(sources, known_ids, client)
+    results = await asyncio.gather(*(
+        source.discover(client, known_ids, max_pages, page_concurrency) for source in sources
+    ))
+    return list(dict.fromkeys(event_id for event_ids in results for event_id in event_ids))
 
 def extract_eventbrite_event_ids():
-    base_url = "https://www.eventbrite.com/d/singapore--singapore/events/"
-    headers = {"User-Agent": "Mozilla/5.0"}
-    
-    try:
-        response = requests.get(base_url, headers=headers, timeout=10)
-    except requests.exceptions.RequestException as e:
-        print(f"Request failed: {str(e)}")
-        return []
-    
-    if response.status_code != 200:
-        print(f"Failed to fetch events page: {response.status_code}")
-        return []
-    
-    # Extract event IDs using regex from window.__SERVER_DATA__
-    event_ids = re.findall(r'"eventbrite_event_id":"(\d+)"', response.text)
-    
-    return event_ids
+    return asyncio.run(discover_event_ids([EventbriteSource()]))
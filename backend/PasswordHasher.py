@@ -0,0 +1,84 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from bcrypt import hashpw, gensalt, checkpw
+
+class HasherBusyError(Exception):
+    '''
+    Raised when more hashing jobs are waiting than the configured queue depth allows
+    '''
+
+def _hash(password, rounds):
+    return hashpw(password, gensalt(rounds))
+
+def _verify(password, hashed):
+    try:
+        return checkpw(password, hashed)
+    except ValueError:
+        # stored value is not a bcrypt hash (e.g. a legacy plaintext password), it can never match
+        return False
+
+class PasswordHasher:
+    '''
+    PasswordHasher runs bcrypt on a bounded worker pool so that hashing bursts do not block the event loop.
+    bcrypt releases the GIL, so the default thread pool hashes in parallel; a process pool can be used instead.
+    '''
+    def __init__(self):
+        self.rounds = int(os.getenv("BCRYPT_ROUNDS", 12))
+        self.workers = int(os.getenv("PASSWORD_HASHER_WORKERS", os.cpu_count() or 1))
+        self.max_queue = int(os.getenv("PASSWORD_HASHER_MAX_QUEUE", 100))
+        if os.getenv("PASSWORD_HASHER_POOL", "thread") == "process":
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_seconds = 0.0
+
+    async def _run(self, fn, *args):
+        if self.in_flight >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise HasherBusyError("Too many password hashing requests, try again later.")
+        self.in_flight += 1
+        start = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self.total_seconds += time.perf_counter() - start
+
+    async def hash(self, password):
+        '''
+        Function:   Hashes a password for storing in db
+        Input:      password:str
+        Output:     hashed_password:bytes
+        '''
+        return await self._run(_hash, password.encode('utf-8'), self.rounds)
+
+    async def verify(self, password, hashed_password):
+        '''
+        Function:   Verifies inputted text password with hashed password in db
+        Input:      password:str, hashed_password:bytes/bytearray/str
+        Output:     success:bool
+        '''
+        if isinstance(hashed_password, str):
+            hashed_password = hashed_password.encode('utf-8')
+        return await self._run(_verify, password.encode('utf-8'), bytes(hashed_password))
+
+    def stats(self):
+        return {
+            "rounds": self.rounds,
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "queue_depth": max(0, self.in_flight - self.workers),
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_seconds": self.total_seconds / self.completed if self.completed else 0.0,
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
@@ -3,10 +3,12 @@ import datetime
 
 class QueryManager:
     '''
-    QueryManager stores the queries to be used for interaction with the database
+    QueryManager stores the queries to be used for interaction with the database.
+    Every method returns the result of db.execute_query, so with an AsyncDatabase
+    the methods return awaitables instead of records.
     '''
-    def __init__(self):
-        self.db = Database()
+    def __init__(self, db=None):
+        self.db = db if db is not None else Database()
 
     def create_user(self, json):
         '''
@@ -16,10 +18,35 @@ class QueryManager:
             CREATE (:User {
                 username: $username, password: $password, email: $email, 
                 birth_date: $birth_date, gender: $gender, region: $region,
-                about_me: $about_me, linkedin_url: $linkedin_url, github_url: $github_url
+                about_me: $about_me, linkedin_url: $linkedin_url, github_url: $github_url,
+                rand: rand()
             })
             """
-        self.db.execute_query(query, json)
+        return self.db.execute_query(query, json)
+
+    def create_users(self, json):
+        '''
+        create_users creates User nodes together with their INTERESTED_IN and SKILLED_IN
+        relationships in a single transaction, json["users"] is a list of user dicts
+        '''
+        query = """
+            UNWIND $users AS user
+            CREATE (u:User {
+                username: user.username, password: user.password, email: user.email,
+                birth_date: user.birth_date, gender: user.gender, region: user.region,
+                about_me: user.about_me, linkedin_url: user.linkedin_url, github_url: user.github_url,
+                rand: rand()
+            })
+            FOREACH (topic IN coalesce(user.interests, []) |
+                MERGE (t:Topic {name: topic})
+                CREATE (u)-[:INTERESTED_IN {weightage: $weightage}]->(t)
+            )
+            FOREACH (topic IN coalesce(user.skills, []) |
+                MERGE (t:Topic {name: topic})
+                CREATE (u)-[:SKILLED_IN {weightage: $weightage}]->(t)
+            )
+            """
+        return self.db.execute_query(query, json)
 
     def create_user_interested_topic(self, json):
         '''
@@ -30,7 +57,7 @@ class QueryManager:
             MERGE (t:Topic {name: $topic})
             CREATE (u)-[:INTERESTED_IN {weightage: $weightage}]->(t)
         """
-        self.db.execute_query(query, json)
+        return self.db.execute_query(query, json)
 
     def create_user_skilled_topic(self, json):
         '''
@@ -41,7 +68,7 @@ class QueryManager:
             MERGE (t:Topic {name: $topic})
             CREATE (u)-[:SKILLED_IN {weightage: $weightage}]->(t)
         """
-        self.db.execute_query(query, json)
+        return self.db.execute_query(query, json)
 
     def update_user(self, json):
         '''
@@ -55,7 +82,7 @@ class QueryManager:
             SET u.linkedin_url = $linkedin_url
             SET u.github_url = $github_url
             """
-        self.db.execute_query(query, json)
+        return self.db.execute_query(query, json)
     
     def delete_user_interests_skills(self, json):
         '''
@@ -65,7 +92,33 @@ class QueryManager:
             MATCH (:User {username: $username})-[r]->(:Topic)
             DETACH DELETE r
             """
-        self.db.execute_query(query, json)
+        return self.db.execute_query(query, json)
+
+    def update_user_with_topics(self, json):
+        '''
+        updates a User node and replaces all its relations to Topic in a single transaction
+        '''
+        query = """
+            MATCH (u:User {username: $username})
+            SET u.email = $email
+            SET u.region = $region
+            SET u.about_me = $about_me
+            SET u.linkedin_url = $linkedin_url
+            SET u.github_url = $github_url
+            WITH u
+            OPTIONAL MATCH (u)-[r]->(:Topic)
+            DELETE r
+            WITH DISTINCT u
+            FOREACH (topic IN $interests |
+                MERGE (t:Topic {name: topic})
+                CREATE (u)-[:INTERESTED_IN {weightage: $weightage}]->(t)
+            )
+            FOREACH (topic IN $skills |
+                MERGE (t:Topic {name: topic})
+                CREATE (u)-[:SKILLED_IN {weightage: $weightage}]->(t)
+            )
+            """
+        return self.db.execute_query(query, json)
 
     def get_user(self, json):
         '''
@@ -75,7 +128,29 @@ class QueryManager:
             MATCH (u:User {username: $username})
             RETURN u
         """
-        return self.db.execute_query(query, json)
+        return self.db.execute_query(query, json, read=True)
+
+    def get_users(self, json):
+        '''
+        returns user data for a list of usernames, in the same order as the list
+        '''
+        query = """
+            UNWIND range(0, size($usernames) - 1) AS idx
+            MATCH (u:User {username: $usernames[idx]})
+            RETURN u
+            ORDER BY idx
+        """
+        return self.db.execute_query(query, json, read=True)
+
+    def get_friends(self, json):
+        '''
+        returns user data of all friends of specified username
+        '''
+        query = """
+            MATCH (:User {username: $username})-[:IS_FRIENDS_WITH]->(f:User)
+            RETURN f AS u
+        """
+        return self.db.execute_query(query, json, read=True)
 
     def get_user_interests(self, json):
         '''
@@ -84,19 +159,19 @@ class QueryManager:
         query = """
             MATCH (:User {username: $username})-[r:INTERESTED_IN]->(t:Topic)
             WHERE r.weightage > $threshold
-            RETURN t.name AS topic
+            RETURN t.name AS topic, r.weightage AS weightage
         """
-        return self.db.execute_query(query, json)
+        return self.db.execute_query(query, json, read=True)
 
-    def attempt_login(self, json):
+    def get_password_hash(self, json):
         '''
-        returns success if a user with specified username and password is found
+        returns the stored password hash for specified username
         '''
         query = """
-            MATCH (u:User {username: $username, password: $password})
-            RETURN u.username
+            MATCH (u:User {username: $username})
+            RETURN u.password AS password
         """
-        return self.db.execute_query(query, json)
+        return self.db.execute_query(query, json, read=True)
     
     def get_usernames(self):
         '''
@@ -106,7 +181,27 @@ class QueryManager:
             MATCH (u:User)
             RETURN u.username AS username
         """
-        return self.db.execute_query(query, {})
+        return self.db.execute_query(query, {}, read=True)
+
+    def get_random_users(self, json):
+        '''
+        returns up to $limit distinct users, each one the first user whose indexed rand is at or above a seed
+        '''
+        query = """
+            UNWIND $seeds AS seed
+            CALL {
+                WITH seed
+                MATCH (u:User)
+                WHERE u.rand >= seed
+                RETURN u
+                ORDER BY u.rand
+                LIMIT 1
+            }
+            WITH DISTINCT u
+            RETURN u
+            LIMIT $limit
+        """
+        return self.db.execute_query(query, json, read=True)
 
     def create_friendship(self, json):
         '''
@@ -118,7 +213,7 @@ class QueryManager:
             MERGE (u1)-[:IS_FRIENDS_WITH]->(u2)
             MERGE (u1)<-[:IS_FRIENDS_WITH]-(u2)
             """
-        self.db.execute_query(query, json)
+        return self.db.execute_query(query, json)
     
     def delete_friendship(self, json):
         '''
@@ -130,7 +225,7 @@ class QueryManager:
             DELETE r1
             DELETE r2
             """
-        self.db.execute_query(query, json)
+        return self.db.execute_query(query, json)
         
 
     def create_or_update_event(self, json):
@@ -150,11 +245,20 @@ class QueryManager:
             SET e.venue_address = $venue_address
             SET e.venue_lat = $venue_lat
             SET e.venue_long = $venue_long
+            SET e.location = CASE
+                WHEN $venue_lat IS NULL OR $venue_long IS NULL THEN null
+                ELSE point({latitude: toFloat($venue_lat), longitude: toFloat($venue_long)})
+            END
             SET e.venue_region = $venue_region
             SET e.organizer_name = $organizer_name 
             SET e.organizer_website = $organizer_website
+            SET e.content_hash = $content_hash
+            SET e.embed_hash = $embed_hash
+            SET e.changed = $changed
+            SET e.expired = false
+            SET e.rand = coalesce(e.rand, rand())
         """
-        self.db.execute_query(query, json)
+        return self.db.execute_query(query, json)
     
     def create_event_to_topic(self, json):
         query = """
@@ -162,7 +266,7 @@ class QueryManager:
             MERGE (t:Topic {name: $category})
             MERGE (e)-[:CATEGORISED_AS]->(t)
         """
-        self.db.execute_query(query, json)
+        return self.db.execute_query(query, json)
 
     def create_event_to_type(self, json):
         query = """
@@ -170,83 +274,327 @@ class QueryManager:
             MERGE (ty:Type {name: $type})
             MERGE (e)-[:IS_OF_TYPE]->(ty)
         """
-        self.db.execute_query(query, json)
+        return self.db.execute_query(query, json)
 
-    def get_events(self):
+    def get_event_hashes(self, json):
+        '''
+        returns the stored content and embed hashes for a list of eventids
+        '''
+        query = """
+            UNWIND $eventids AS eventid
+            MATCH (e:Event {eventid: eventid})
+            RETURN e.eventid AS eventid, e.content_hash AS content_hash, e.embed_hash AS embed_hash
+        """
+        return self.db.execute_query(query, json, read=True)
+
+    def set_event_embed_hashes(self, json):
+        '''
+        records the embed hash of events once they are stored in the vector db
+        '''
+        query = """
+            UNWIND $events AS event
+            MATCH (e:Event {eventid: event.eventid})
+            SET e.embed_hash = event.embed_hash
+        """
+        return self.db.execute_query(query, json)
+
+    def expire_events(self, json):
+        '''
+        soft-expires events that ended before $now (local time string in the same format as endtime_local)
+        '''
+        query = """
+            MATCH (e:Event)
+            WHERE e.endtime_local < $now AND e.expired = false
+            SET e.expired = true
+            RETURN count(e) AS expired
+        """
+        return self.db.execute_query(query, json)
+
+    def get_events(self, json):
+        '''
+        returns a page of up to $limit events ordered by start time then eventid, after the ($starttime, $eventid) cursor
+        '''
         query = """
             MATCH (e:Event)
-            MATCH (e)-[:CATEGORISED_AS]->(t:Topic)
-            MATCH (e)-[:IS_OF_TYPE]->(ty:Type)
+            WHERE e.starttime_local >= coalesce($starttime, '')
+                AND ($starttime IS NULL OR e.starttime_local > $starttime OR e.eventid > $eventid)
+                AND NOT coalesce(e.expired, false)
+            WITH e
+            ORDER BY e.starttime_local, e.eventid
+            LIMIT $limit
+            OPTIONAL MATCH (e)-[:CATEGORISED_AS]->(t:Topic)
+            OPTIONAL MATCH (e)-[:IS_OF_TYPE]->(ty:Type)
             RETURN e, t.name AS topic, ty.name AS type
+            ORDER BY e.starttime_local, e.eventid
         """
-        return self.db.execute_query(query, {})
+        return self.db.execute_query(query, json, read=True)
     
-    def create_thread(self, json):
+    def get_events_by_ids(self, json):
+        '''
+        returns events for a list of eventids, in the same order as the list
+        '''
         query = """
-            CREATE (th:Thread {
-                title: $title, datetime: $datetime, description: $description,
-                code: $code 
-            })
+            UNWIND range(0, size($eventids) - 1) AS idx
+            MATCH (e:Event {eventid: $eventids[idx]})
+            WHERE NOT coalesce(e.expired, false)
+            OPTIONAL MATCH (e)-[:CATEGORISED_AS]->(t:Topic)
+            OPTIONAL MATCH (e)-[:IS_OF_TYPE]->(ty:Type)
+            RETURN e, t.name AS topic, ty.name AS type
+            ORDER BY idx
         """
-        self.db.execute_query(query, json)
+        return self.db.execute_query(query, json, read=True)
     
-    def create_thread_to_user(self, json):
+    def get_random_events(self, json):
+        '''
+        returns up to $limit distinct events, each one the first event whose indexed rand is at or above a seed
+        '''
         query = """
-            MATCH (th:Thread {title: $title})
-            MATCH (u:User {username: $username})
-            CREATE (th)-[:CREATED_BY]->(u)
+            UNWIND $seeds AS seed
+            CALL {
+                WITH seed
+                MATCH (e:Event)
+                WHERE e.rand >= seed AND NOT coalesce(e.expired, false)
+                RETURN e
+                ORDER BY e.rand
+                LIMIT 1
+            }
+            WITH DISTINCT e
+            LIMIT $limit
+            OPTIONAL MATCH (e)-[:CATEGORISED_AS]->(t:Topic)
+            OPTIONAL MATCH (e)-[:IS_OF_TYPE]->(ty:Type)
+            RETURN e, t.name AS topic, ty.name AS type
         """
-        self.db.execute_query(query, json)
+        return self.db.execute_query(query, json, read=True)
+    
+    def get_events_near(self, json):
+        '''
+        returns up to $limit events within $radius metres of ($latitude, $longitude), nearest first
+        '''
+        query = """
+            WITH point({latitude: $latitude, longitude: $longitude}) AS here
+            MATCH (e:Event)
+            WHERE point.distance(e.location, here) <= $radius AND NOT coalesce(e.expired, false)
+            WITH e, point.distance(e.location, here) AS distance
+            ORDER BY distance
+            LIMIT $limit
+            OPTIONAL MATCH (e)-[:CATEGORISED_AS]->(t:Topic)
+            OPTIONAL MATCH (e)-[:IS_OF_TYPE]->(ty:Type)
+            RETURN e, t.name AS topic, ty.name AS type, distance
+        """
+        return self.db.execute_query(query, json, read=True)
 
-    def create_thread_to_topic(self, json):
+    # Filters of the events map: the bounding box is served by the point index, the other predicates are optional
+    EVENTS_WITHIN_FILTER = """
+            MATCH (e:Event)
+            WHERE point.withinBBox(
+                    e.location,
+                    point({latitude: $min_lat, longitude: $min_long}),
+                    point({latitude: $max_lat, longitude: $max_long})
+                )
+                AND NOT coalesce(e.expired, false)
+                AND ($radius IS NULL OR point.distance(e.location, point({latitude: $latitude, longitude: $longitude})) <= $radius)
+                AND ($start IS NULL OR e.endtime_local >= $start)
+                AND ($end IS NULL OR e.starttime_local <= $end)
+                AND ($categories IS NULL OR EXISTS {
+                    MATCH (e)-[:CATEGORISED_AS]->(t:Topic) WHERE t.name IN $categories
+                })
+    """
+
+    def get_events_within(self, json):
+        '''
+        returns up to $limit map markers of events in the bounding box that pass the filters, soonest first
+        '''
+        query = self.EVENTS_WITHIN_FILTER + """
+            WITH e
+            ORDER BY e.starttime_local
+            LIMIT $limit
+            OPTIONAL MATCH (e)-[:CATEGORISED_AS]->(t:Topic)
+            RETURN e.eventid AS eventid, e.name AS name, e.logo AS logo, e.is_free AS is_free,
+                e.starttime_local AS starttime_local, e.endtime_local AS endtime_local,
+                e.location.latitude AS latitude, e.location.longitude AS longitude, t.name AS category
+        """
+        return self.db.execute_query(query, json, read=True)
+
+    def get_event_clusters_within(self, json):
+        '''
+        groups the events in the bounding box that pass the filters into grid cells of $cell degrees
+        '''
+        query = self.EVENTS_WITHIN_FILTER + """
+            WITH e,
+                toInteger(floor(e.location.latitude / $cell)) AS row,
+                toInteger(floor(e.location.longitude / $cell)) AS col
+            WITH row, col, count(e) AS count,
+                avg(e.location.latitude) AS latitude, avg(e.location.longitude) AS longitude,
+                collect(e.eventid)[..1] AS sample
+            RETURN count, latitude, longitude, sample[0] AS eventid
+            ORDER BY count DESC
+            LIMIT $limit
+        """
+        return self.db.execute_query(query, json, read=True)
+
+    def create_thread(self, json):
+        '''
+        creates a thread with a generated threadid, linked to its creator and topics
+        '''
         query = """
-            MATCH (th:Thread {title: $title})
-            MATCH (t:Topic {name: $topic})
-            CREATE (th)-[:RELATED_TO]->(t)
+            MATCH (u:User {username: $username})
+            CREATE (th:Thread {
+                threadid: randomUUID(), title: $title, datetime: $datetime, description: $description,
+                code: $code, activity: $activity
+            })
+            CREATE (th)-[:CREATED_BY]->(u)
+            WITH th
+            CALL {
+                WITH th
+                UNWIND $interests AS interest
+                MATCH (t:Topic {name: interest})
+                CREATE (th)-[:RELATED_TO]->(t)
+            }
+            RETURN th.threadid AS threadid
         """
-        self.db.execute_query(query, json)
+        return self.db.execute_query(query, json)
 
     def create_comment(self, json):
         query = """
-            MATCH (th:Thread {title: $title})
+            MATCH (th:Thread {threadid: $threadid})
             MATCH (u:User {username: $username})
             CREATE (c:Comment {
-                datetime: $datetime, description: $description
+                commentid: randomUUID(), datetime: $datetime, description: $description
             })
             CREATE (c)-[:CREATED_BY]->(u)
             CREATE (c)-[:BELONGS_TO]->(th)
+            SET th.activity = $activity
         """
-        self.db.execute_query(query, json)
+        return self.db.execute_query(query, json)
     
     def get_thread(self, json):
+        '''
+        returns a thread with its creator, topics and first $limit comments in one lookup by threadid
+        '''
         query = """
-            MATCH (th:Thread {title: $title})
-            MATCH (th)-[:CREATED_BY]->(u:User)
-            RETURN th, u.username AS username
+            MATCH (th:Thread {threadid: $threadid})
+            CALL {
+                WITH th
+                MATCH (c:Comment)-[:BELONGS_TO]->(th)
+                WITH c
+                ORDER BY c.datetime, c.commentid
+                LIMIT $limit
+                RETURN collect(c {.*, username: [(c)-[:CREATED_BY]->(cu:User) | cu.username][0]}) AS comments
+            }
+            RETURN th,
+                [(th)-[:CREATED_BY]->(u:User) | u.username][0] AS username,
+                [(th)-[:RELATED_TO]->(t:Topic) | t.name] AS interests,
+                comments
         """
-        return self.db.execute_query(query, json)
+        return self.db.execute_query(query, json, read=True)
     
     def get_comments_from_thread(self, json):
+        '''
+        returns a page of up to $limit comments of a thread, oldest first, after the ($datetime, $commentid) cursor
+        '''
         query = """
-            MATCH (th:Thread {title: $title})
+            MATCH (th:Thread {threadid: $threadid})
             MATCH (c:Comment)-[:BELONGS_TO]->(th)
+            WHERE $datetime IS NULL OR c.datetime > $datetime OR (c.datetime = $datetime AND c.commentid > $commentid)
+            WITH c
+            ORDER BY c.datetime, c.commentid
+            LIMIT $limit
             MATCH (c)-[:CREATED_BY]->(u:User)
             RETURN c, u.username AS username
+            ORDER BY c.datetime, c.commentid
         """
-        return self.db.execute_query(query, json)
+        return self.db.execute_query(query, json, read=True)
     
-    def get_topics_from_thread(self, json):
+    def get_threads(self, json):
+        '''
+        returns a page of up to $limit threads, newest first, after the ($datetime, $threadid) cursor
+        '''
         query = """
-            MATCH (th:Thread {title: $title})
-            MATCH (th)<-[:RELATED_TO]->(t:Topic)
-            RETURN t.name AS name
+            MATCH (th:Thread)
+            WHERE th.datetime <= coalesce($datetime, localdatetime('9999-12-31T23:59:59'))
+                AND ($datetime IS NULL OR th.datetime < $datetime OR th.threadid < $threadid)
+            WITH th
+            ORDER BY th.datetime DESC, th.threadid DESC
+            LIMIT $limit
+            MATCH (th)-[:CREATED_BY]->(u:User)
+            RETURN th.threadid AS threadid, th.title AS title, th.datetime AS datetime, u.username AS username
+            ORDER BY th.datetime DESC, th.threadid DESC
+        """
+        return self.db.execute_query(query, json, read=True)
+
+    def update_thread_feeds(self, json):
+        '''
+        scores a thread for every user interested in its topics, log(interest overlap) + activity / $tau,
+        and trims those users' feeds to the $size best items
+        '''
+        query = """
+            MATCH (th:Thread {threadid: $threadid})-[:RELATED_TO]->(:Topic)<-[i:INTERESTED_IN]-(u:User)
+            WITH th, u, sum(i.weightage) AS overlap
+            WHERE overlap > 0
+            MERGE (u)-[f:FEED_ITEM]->(th)
+            SET f.score = log(1 + overlap) + th.activity / $tau
+            WITH DISTINCT u
+            CALL {
+                WITH u
+                MATCH (u)-[f:FEED_ITEM]->(:Thread)
+                WITH f
+                ORDER BY f.score DESC
+                SKIP $size
+                DELETE f
+            }
+            RETURN count(u) AS users
         """
         return self.db.execute_query(query, json)
-    
-    def get_threads(self):
+
+    def rebuild_user_feed(self, json):
+        '''
+        replaces a user's feed with the $size best scored threads of their interests and marks it as built
+        '''
         query = """
-            MATCH (th:Thread)
+            MATCH (u:User {username: $username})
+            CALL {
+                WITH u
+                MATCH (u)-[f:FEED_ITEM]->(:Thread)
+                DELETE f
+            }
+            CALL {
+                WITH u
+                MATCH (u)-[i:INTERESTED_IN]->(:Topic)<-[:RELATED_TO]-(th:Thread)
+                WITH u, th, sum(i.weightage) AS overlap
+                WHERE overlap > 0
+                WITH u, th, log(1 + overlap) + th.activity / $tau AS score
+                ORDER BY score DESC
+                LIMIT $size
+                CREATE (u)-[:FEED_ITEM {score: score}]->(th)
+            }
+            SET u.feed_built_at = datetime()
+            RETURN COUNT { (u)-[:FEED_ITEM]->(:Thread) } AS items
+        """
+        return self.db.execute_query(query, json)
+
+    def get_feed_built(self, json):
+        '''
+        returns whether a user's feed has ever been built, users from before feeds existed only have fanned out items
+        '''
+        query = """
+            MATCH (u:User {username: $username})
+            RETURN u.feed_built_at IS NOT NULL AS built
+        """
+        return self.db.execute_query(query, json, read=True)
+
+    def get_feed(self, json):
+        '''
+        returns a page of up to $limit threads of a user's feed, best first, after the ($score, $threadid) cursor
+        '''
+        query = """
+            MATCH (:User {username: $username})-[f:FEED_ITEM]->(th:Thread)
+            WHERE $score IS NULL OR f.score < $score OR (f.score = $score AND th.threadid < $threadid)
+            WITH f, th
+            ORDER BY f.score DESC, th.threadid DESC
+            LIMIT $limit
             MATCH (th)-[:CREATED_BY]->(u:User)
-            RETURN th.title AS title, u.username AS username
+            RETURN th.threadid AS threadid, th.title AS title, th.datetime AS datetime, u.username AS username,
+                f.score AS score
+            ORDER BY f.score DESC, th.threadid DESC
         """
-        return self.db.execute_query(query, {})
\ No newline at end of file
+        return self.db.execute_query(query, json, read=True)
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+
+try:
+    import redis.asyncio as redis
+except ImportError:
+    redis = None
+
+class MemoryBackend:
+    '''
+    MemoryBackend is a per-process TTL + LRU store
+    '''
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.counters = {}
+
+    async def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    async def set(self, key, value, ttl):
+        self.entries[key] = (time.monotonic() + ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    async def get_counters(self, keys):
+        return [self.counters.get(key, 0) for key in keys]
+
+    async def incr(self, key):
+        self.counters[key] = self.counters.get(key, 0) + 1
+
+    def size(self):
+        return len(self.entries)
+
+class RedisBackend:
+    '''
+    RedisBackend stores entries in a Redis-compatible server so that all API workers share them,
+    eviction is left to the server's maxmemory-policy (e.g. allkeys-lru)
+    '''
+    def __init__(self, url):
+        self.client = redis.from_url(url)
+
+    async def get(self, key):
+        value = await self.client.get(key)
+        return json.loads(value) if value is not None else None
+
+    async def set(self, key, value, ttl):
+        await self.client.set(key, json.dumps(value, default=str), ex=int(ttl))
+
+    async def get_counters(self, keys):
+        return [int(value or 0) for value in await self.client.mget(keys)]
+
+    async def incr(self, key):
+        await self.client.incr(key)
+
+    def size(self):
+        return None
+
+class RecommendationCache:
+    '''
+    RecommendationCache stores recommendation results keyed by kind (friends/events), username and the hash
+    of the user's interest set. Invalidation bumps a per-user or per-kind generation counter that is part
+    of the key, so stale entries are never read again and simply expire.
+    '''
+    def __init__(self):
+        self.ttl = float(os.getenv("RECOMMENDATION_CACHE_TTL", 300))
+        self.hits = 0
+        self.misses = 0
+        url = os.getenv("RECOMMENDATION_CACHE_REDIS_URL")
+        if url and redis is not None:
+            self.backend = RedisBackend(url)
+        else:
+            if url:
+                logging.warning("RECOMMENDATION_CACHE_REDIS_URL is set but redis is not installed, using in-memory cache")
+            self.backend = MemoryBackend(int(os.getenv("RECOMMENDATION_CACHE_SIZE", 10000)))
+
+    async def _key(self, kind, username, interests):
+        kind_generation, user_generation = await self.backend.get_counters([f"reco:gen:kind:{kind}", f"reco:gen:user:{username}"])
+        interests_hash = hashlib.sha1("\n".join(sorted(set(interests))).encode('utf-8')).hexdigest()
+        return f"reco:{kind}:{kind_generation}:{username}:{user_generation}:{interests_hash}"
+
+    async def get(self, kind, username, interests):
+        '''
+        Function:   Gets a cached recommendation result
+        Input:      kind:str, username:str, interests:list of str
+        Output:     cached result or None
+        '''
+        try:
+            value = await self.backend.get(await self._key(kind, username, interests))
+        except Exception as e:
+            logging.error(f"Recommendation cache get failed: {e}")
+            value = None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, kind, username, interests, value):
+        '''
+        Function:   Caches a recommendation result
+        Input:      kind:str, username:str, interests:list of str, value:json
+        Output:     None
+        '''
+        try:
+            await self.backend.set(await self._key(kind, username, interests), value, self.ttl)
+        except Exception as e:
+            logging.error(f"Recommendation cache set failed: {e}")
+
+    async def invalidate_user(self, *usernames):
+        '''
+        Function:   Drops every cached result of the given users
+        Input:      usernames:str
+        Output:     None
+        '''
+        for username in usernames:
+            await self.backend.incr(f"reco:gen:user:{username}")
+
+    async def invalidate_kind(self, kind):
+        '''
+        Function:   Drops every cached result of a kind for all users, e.g. events after a new event is added
+        Input:      kind:str
+        Output:     None
+        '''
+        await self.backend.incr(f"reco:gen:kind:{kind}")
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "size": self.backend.size(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from urllib.parse import urlsplit
+
+import httpx
+
+class CircuitOpenError(Exception):
+    '''
+    Raised when a request is refused because the circuit for its host is open
+    '''
+
+class CircuitBreaker:
+    '''
+    CircuitBreaker stops sending requests to a host after failure_threshold consecutive failures.
+    After reset_timeout seconds one trial request is let through (half open), which closes the
+    circuit again on success or re-opens it on failure.
+    '''
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_in_flight = False
+        if self.failures >= self.failure_threshold or self.opened_at is not None:
+            self.opened_at = time.monotonic()
+
+class RecommenderClient:
+    '''
+    RecommenderClient holds one keep-alive HTTP/2 connection pool and circuit breaker per recommender host,
+    and retries transient failures with full-jitter exponential backoff
+    '''
+    RETRY_STATUS_CODES = {502, 503, 504}
+
+    def __init__(self):
+        self.max_connections = int(os.getenv("RECOMMENDER_MAX_CONNECTIONS_PER_HOST", 20))
+        self.timeout = httpx.Timeout(
+            connect=float(os.getenv("RECOMMENDER_CONNECT_TIMEOUT", 2)),
+            read=float(os.getenv("RECOMMENDER_READ_TIMEOUT", 30)),
+            write=float(os.getenv("RECOMMENDER_WRITE_TIMEOUT", 10)),
+            pool=float(os.getenv("RECOMMENDER_POOL_TIMEOUT", 5)),
+        )
+        self.retries = int(os.getenv("RECOMMENDER_RETRIES", 2))
+        self.backoff_base = float(os.getenv("RECOMMENDER_BACKOFF_BASE", 0.2))
+        self.backoff_max = float(os.getenv("RECOMMENDER_BACKOFF_MAX", 2))
+        self.failure_threshold = int(os.getenv("RECOMMENDER_FAILURE_THRESHOLD", 5))
+        self.reset_timeout = float(os.getenv("RECOMMENDER_RESET_TIMEOUT", 30))
+        self.clients = {}
+        self.breakers = {}
+
+    def _host(self, url):
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def _client(self, host):
+        if host not in self.clients:
+            self.clients[host] = httpx.AsyncClient(
+                http2=True,
+                timeout=self.timeout,
+                follow_redirects=True,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+                headers={"Accept": "application/json"},
+            )
+        return self.clients[host]
+
+    def _breaker(self, host):
+        if host not in self.breakers:
+            self.breakers[host] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+        return self.breakers[host]
+
+    async def post(self, url, data):
+        '''
+        Function:   POSTs data as json to url, retrying connection errors, timeouts and 502/503/504
+        Input:      url:str, data:json
+        Output:     httpx.Response of the last attempt, raises CircuitOpenError or httpx.HTTPError
+        '''
+        host = self._host(url)
+        breaker = self._breaker(host)
+        for attempt in range(self.retries + 1):
+            if not breaker.allow():
+                raise CircuitOpenError(f"Circuit open for {host}")
+            trial = breaker.trial_in_flight
+            try:
+                response = await self._client(host).post(url, json=data)
+            except httpx.TransportError as e:
+                breaker.record_failure()
+                if attempt == self.retries:
+                    raise
+                logging.warning(f"Recommendation request to {url} failed ({e!r}), retrying")
+            else:
+                if response.status_code not in self.RETRY_STATUS_CODES:
+                    breaker.record_success()
+                    return response
+                breaker.record_failure()
+                if attempt == self.retries:
+                    return response
+                logging.warning(f"Recommendation request to {url} returned {response.status_code}, retrying")
+            finally:
+                # a trial that was cancelled or raised anything else gave no verdict, let the next request try
+                if trial:
+                    breaker.trial_in_flight = False
+            await asyncio.sleep(random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt)))
+
+    def stats(self):
+        return {host: {"state": breaker.state, "failures": breaker.failures} for host, breaker in self.breakers.items()}
+
+    async def close(self):
+        for client in self.clients.values():
+            await client.aclose()
+        self.clients = {}
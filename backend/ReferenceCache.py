@@ -0,0 +1,78 @@
+import json
+import os
+import sqlite3
+import time
+
+class ReferenceCache:
+    """
+    Persistent TTL cache for Eventbrite reference data (venues, organizers, categories) keyed by
+    entity type and id, stored in a sqlite file so that it survives between ingestion runs.
+    """
+    DEFAULT_TTLS = {
+        "venues": 7 * 24 * 3600,
+        "organizers": 7 * 24 * 3600,
+        "categories": 30 * 24 * 3600,
+    }
+
+    def __init__(self, path=None):
+        DIR = os.path.dirname(os.path.abspath(__file__))
+        self.path = path or os.getenv("EVENTBRITE_CACHE_PATH", os.path.join(DIR, "reference_cache.sqlite3"))
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS reference (
+                entity_type TEXT NOT NULL,
+                entity_id TEXT NOT NULL,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (entity_type, entity_id)
+            )
+        """)
+        self.conn.commit()
+        self.ttls = {
+            entity_type: float(os.getenv(f"EVENTBRITE_CACHE_TTL_{entity_type.upper()}", ttl))
+            for entity_type, ttl in self.DEFAULT_TTLS.items()
+        }
+        self.hits = {entity_type: 0 for entity_type in self.ttls}
+        self.misses = {entity_type: 0 for entity_type in self.ttls}
+
+    def get(self, entity_type, entity_id):
+        '''
+        Returns the cached value or None if it is missing or expired
+        '''
+        row = self.conn.execute(
+            "SELECT value FROM reference WHERE entity_type = ? AND entity_id = ? AND expires_at > ?",
+            (entity_type, str(entity_id), time.time())
+        ).fetchone()
+        if row is None:
+            self.misses[entity_type] = self.misses.get(entity_type, 0) + 1
+            return None
+        self.hits[entity_type] = self.hits.get(entity_type, 0) + 1
+        return json.loads(row[0])
+
+    def set(self, entity_type, entity_id, value):
+        ttl = self.ttls.get(entity_type, 24 * 3600)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO reference (entity_type, entity_id, value, expires_at) VALUES (?, ?, ?, ?)",
+            (entity_type, str(entity_id), json.dumps(value), time.time() + ttl)
+        )
+        self.conn.commit()
+
+    def purge_expired(self):
+        '''
+        Deletes expired rows, which get() already ignores, so that the file does not keep growing.
+        Returns the number of rows deleted
+        '''
+        deleted = self.conn.execute("DELETE FROM reference WHERE expires_at <= ?", (time.time(),)).rowcount
+        self.conn.commit()
+        return deleted
+
+    def stats(self):
+        stats = {}
+        for entity_type in self.hits:
+            hits, misses = self.hits[entity_type], self.misses.get(entity_type, 0)
+            total = hits + misses
+            stats[entity_type] = {"hits": hits, "misses": misses, "hit_rate": hits / total if total else 0.0}
+        return stats
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,116 @@
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Planning area centroids of Singapore, grouped by the region they belong to
+REGION_LOCATIONS = {
+    "Central": [
+        (1.2800, 103.8500),  # Downtown Core
+        (1.3048, 103.8318),  # Orchard
+        (1.3294, 103.8021),  # Bukit Timah
+        (1.3343, 103.8563),  # Toa Payoh
+        (1.3526, 103.8352),  # Bishan
+        (1.2942, 103.7861),  # Queenstown
+        (1.3204, 103.8438),  # Novena
+        (1.3100, 103.8651),  # Kallang
+        (1.3020, 103.8971),  # Marine Parade
+        (1.3201, 103.8918),  # Geylang
+        (1.2819, 103.8239),  # Bukit Merah
+    ],
+    "East": [
+        (1.3236, 103.9273),  # Bedok
+        (1.3496, 103.9568),  # Tampines
+        (1.3721, 103.9474),  # Pasir Ris
+        (1.3644, 103.9915),  # Changi
+    ],
+    "North": [
+        (1.4382, 103.7890),  # Woodlands
+        (1.4304, 103.8354),  # Yishun
+        (1.4491, 103.8185),  # Sembawang
+        (1.4044, 103.7894),  # Mandai
+        (1.4134, 103.7580),  # Sungei Kadut
+    ],
+    "North-East": [
+        (1.3691, 103.8454),  # Ang Mo Kio
+        (1.3612, 103.8863),  # Hougang
+        (1.3984, 103.9072),  # Punggol
+        (1.3868, 103.8914),  # Sengkang
+        (1.3554, 103.8679),  # Serangoon
+        (1.4043, 103.8692),  # Seletar
+    ],
+    "West": [
+        (1.3404, 103.7090),  # Jurong West
+        (1.3329, 103.7436),  # Jurong East
+        (1.3590, 103.7637),  # Bukit Batok
+        (1.3774, 103.7719),  # Bukit Panjang
+        (1.3840, 103.7470),  # Choa Chu Kang
+        (1.3162, 103.7649),  # Clementi
+        (1.2966, 103.6359),  # Tuas
+        (1.3385, 103.7058),  # Boon Lay
+    ],
+}
+
+class RegionLocator:
+    '''
+    RegionLocator assigns coordinates to the region of their nearest planning area centroid,
+    using a haversine distance vectorized over all centroids (and all coordinates when classifying many)
+    '''
+    def __init__(self, region_locations=REGION_LOCATIONS):
+        self.regions = np.array([region for region, points in region_locations.items() for _ in points] + ["Unknown"])
+        points = np.radians(np.array([point for points in region_locations.values() for point in points], dtype=np.float64))
+        self.lats = points[:, 0]
+        self.longs = points[:, 1]
+        self.cos_lats = np.cos(self.lats)
+
+    def _haversine_term(self, latitudes, longitudes):
+        lats = np.radians(latitudes)[:, None]
+        longs = np.radians(longitudes)[:, None]
+        return (
+            np.sin((self.lats - lats) / 2) ** 2
+            + np.cos(lats) * self.cos_lats * np.sin((self.longs - longs) / 2) ** 2
+        )
+
+    def distances_km(self, latitudes, longitudes):
+        '''
+        Function:   Haversine distance from every coordinate to every centroid
+        Input:      latitudes, longitudes: array-likes of degrees with the same shape (n,)
+        Output:     array of shape (n, number of centroids) in km
+        '''
+        a = self._haversine_term(self._to_array(latitudes), self._to_array(longitudes))
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+    def classify(self, latitudes, longitudes):
+        '''
+        Function:   Nearest region of many coordinates at once, coordinates that are missing or not numbers get "Unknown"
+        Input:      latitudes, longitudes: array-likes of degrees (str/float/None)
+        Output:     list of region names
+        '''
+        lats, longs = self._to_array(latitudes), self._to_array(longitudes)
+        if len(lats) == 0:
+            return []
+        # the haversine term grows monotonically with distance, so it is enough to find the nearest centroid
+        nearest = np.argmin(self._haversine_term(lats, longs), axis=1)
+        nearest[np.isnan(lats) | np.isnan(longs)] = len(self.regions) - 1
+        return self.regions[nearest].tolist()
+
+    def nearest(self, latitude, longitude):
+        '''
+        Function:   Nearest region of one coordinate
+        Input:      latitude, longitude: degrees (str/float/None)
+        Output:     region name or "Unknown"
+        '''
+        return self.classify([latitude], [longitude])[0]
+
+    @staticmethod
+    def _to_array(values):
+        try:
+            return np.asarray(values, dtype=np.float64).reshape(-1)
+        except (TypeError, ValueError):
+            return np.array([RegionLocator._to_float(value) for value in values], dtype=np.float64)
+
+    @staticmethod
+    def _to_float(value):
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return np.nan
@@ -0,0 +1,135 @@
+from Database import AsyncDatabase
+import asyncio
+import datetime
+import logging
+
+def local_utc_offset():
+    '''
+    UTC offset of this server as +HH:MM, the zone of the naive datetimes DBController stores
+    '''
+    offset = int(datetime.datetime.now().astimezone().utcoffset().total_seconds()) // 60
+    sign = '-' if offset < 0 else '+'
+    return f"{sign}{abs(offset) // 60:02d}:{abs(offset) % 60:02d}"
+
+def in_batches(match, variable, update, rows=10000):
+    '''
+    Applies update to every node that match finds, committing every rows nodes so that a backfill over a
+    large graph does not build one huge transaction
+    '''
+    return f"{match} CALL {{ WITH {variable} {update} }} IN TRANSACTIONS OF {rows} ROWS"
+
+class SchemaManager:
+    '''
+    SchemaManager creates the constraints and indexes used by the queries in QueryManager
+    '''
+    CONSTRAINTS = {
+        "user_username_unique": "FOR (u:User) REQUIRE u.username IS UNIQUE",
+        "event_eventid_unique": "FOR (e:Event) REQUIRE e.eventid IS UNIQUE",
+        "topic_name_unique": "FOR (t:Topic) REQUIRE t.name IS UNIQUE",
+        "type_name_unique": "FOR (ty:Type) REQUIRE ty.name IS UNIQUE",
+        "thread_threadid_unique": "FOR (th:Thread) REQUIRE th.threadid IS UNIQUE",
+        "comment_commentid_unique": "FOR (c:Comment) REQUIRE c.commentid IS UNIQUE",
+        "migration_name_unique": "FOR (m:Migration) REQUIRE m.name IS UNIQUE",
+    }
+
+    INDEXES = {
+        "thread_title_range": "RANGE INDEX thread_title_range IF NOT EXISTS FOR (th:Thread) ON (th.title)",
+        "thread_datetime_range": "RANGE INDEX thread_datetime_range IF NOT EXISTS FOR (th:Thread) ON (th.datetime)",
+        "comment_datetime_range": "RANGE INDEX comment_datetime_range IF NOT EXISTS FOR (c:Comment) ON (c.datetime)",
+        "thread_title_text": "TEXT INDEX thread_title_text IF NOT EXISTS FOR (th:Thread) ON (th.title)",
+        "event_name_text": "TEXT INDEX event_name_text IF NOT EXISTS FOR (e:Event) ON (e.name)",
+        "user_rand_range": "RANGE INDEX user_rand_range IF NOT EXISTS FOR (u:User) ON (u.rand)",
+        "event_rand_range": "RANGE INDEX event_rand_range IF NOT EXISTS FOR (e:Event) ON (e.rand)",
+        "event_starttime_range": "RANGE INDEX event_starttime_range IF NOT EXISTS FOR (e:Event) ON (e.starttime_local)",
+        "event_endtime_range": "RANGE INDEX event_endtime_range IF NOT EXISTS FOR (e:Event) ON (e.endtime_local)",
+        "event_location_point": "POINT INDEX event_location_point IF NOT EXISTS FOR (e:Event) ON (e.location)",
+    }
+
+    # Properties that queries rely on but that nodes created before they existed lack. Each backfill runs once,
+    # a (:Migration {name}) node records that it was applied; delete it to run the backfill again.
+    # $timezone is the UTC offset of the naive datetimes, so backfilled activity matches the UTC epoch of new threads
+    BACKFILLS = {
+        "user_rand": in_batches("MATCH (u:User) WHERE u.rand IS NULL", "u", "SET u.rand = rand()"),
+        "event_rand": in_batches("MATCH (e:Event) WHERE e.rand IS NULL", "e", "SET e.rand = rand()"),
+        "event_expired": in_batches("MATCH (e:Event) WHERE e.expired IS NULL", "e", "SET e.expired = false"),
+        "thread_threadid": in_batches("MATCH (th:Thread) WHERE th.threadid IS NULL", "th", "SET th.threadid = randomUUID()"),
+        "thread_activity": in_batches(
+            "MATCH (th:Thread) WHERE th.activity IS NULL", "th",
+            "SET th.activity = datetime({datetime: th.datetime, timezone: $timezone}).epochSeconds"
+        ),
+        "comment_commentid": in_batches("MATCH (c:Comment) WHERE c.commentid IS NULL", "c", "SET c.commentid = randomUUID()"),
+        "event_location": in_batches(
+            "MATCH (e:Event) WHERE e.location IS NULL AND e.venue_lat IS NOT NULL AND e.venue_long IS NOT NULL", "e",
+            "SET e.location = point({latitude: toFloat(e.venue_lat), longitude: toFloat(e.venue_long)})"
+        ),
+    }
+
+    def __init__(self, db=None):
+        self.db = db if db is not None else AsyncDatabase()
+
+    async def migrate(self):
+        '''
+        Function:   Idempotently creates every constraint and index and runs the backfills that have not been
+                    applied yet, failures are logged and skipped so that e.g. existing duplicate data does not
+                    stop the app from starting
+        Input:      None
+        Output:     JSON with names of created/existing, skipped (already backfilled) and failed schema objects
+        '''
+        applied, skipped, failed = [], [], []
+        statements = [
+            (name, f"CREATE CONSTRAINT {name} IF NOT EXISTS {body}") for name, body in self.CONSTRAINTS.items()
+        ] + [
+            (name, f"CREATE {body}") for name, body in self.INDEXES.items()
+        ]
+        for name, statement in statements:
+            try:
+                await self.db.execute_query(statement, {})
+                applied.append(name)
+            except Exception as e:
+                logging.error(f"Schema migration {name} failed: {e}")
+                failed.append(name)
+
+        try:
+            done = {record["name"] for record in await self.db.execute_query("MATCH (m:Migration) RETURN m.name AS name", {})}
+        except Exception as e:
+            logging.error(f"Reading applied migrations failed: {e}")
+            return {"success": False, "applied": applied, "skipped": skipped, "failed": failed + list(self.BACKFILLS)}
+        params = {"timezone": local_utc_offset()}
+        for name, statement in self.BACKFILLS.items():
+            if name in done:
+                skipped.append(name)
+                continue
+            try:
+                await self.db.execute_auto_commit(statement, params)
+                await self.db.execute_query(
+                    "MERGE (m:Migration {name: $name}) SET m.applied_at = datetime()", {"name": name}
+                )
+                applied.append(name)
+            except Exception as e:
+                logging.error(f"Schema migration {name} failed: {e}")
+                failed.append(name)
+        return {"success": len(failed) == 0, "applied": applied, "skipped": skipped, "failed": failed}
+
+    async def get_index_status(self):
+        '''
+        Function:   Reports the state of every index in the database
+        Input:      None
+        Output:     JSON with indexes (list of dict with name, state, type, labels, properties, populationPercent)
+                    and online (bool, True when every index is ONLINE)
+        '''
+        query = """
+            SHOW INDEXES
+            YIELD name, state, type, labelsOrTypes, properties, populationPercent
+            RETURN name, state, type, labelsOrTypes AS labels, properties, populationPercent
+        """
+        indexes = [record.data() for record in await self.db.execute_query(query, {})]
+        return {"indexes": indexes, "online": all(index["state"] == "ONLINE" for index in indexes)}
+
+async def main():
+    schema = SchemaManager()
+    print(await schema.migrate())
+    print(await schema.get_index_status())
+    await schema.db.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
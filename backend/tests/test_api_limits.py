@@ -0,0 +1,27 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import APIManager
+
+# the client is not entered as a context manager, so startup (schema migration, scheduler) does not run
+client = TestClient(APIManager.app)
+
+
+@pytest.mark.parametrize("url", [
+    "/getEvents?limit=0",
+    "/getEvents?limit=-1",
+    "/getEvents?limit=201",
+    "/getEventsNear?latitude=1.3&longitude=103.8&limit=0",
+    "/events/within?latitude=1.3&longitude=103.8&radius_km=1&limit=0",
+    "/getThread?threadid=t&limit=0",
+    "/getComments?threadid=t&limit=0",
+    "/getComments?threadid=t&limit=101",
+])
+def test_out_of_range_limits_are_rejected(url):
+    assert client.get(url).status_code == 422
+
+
+@pytest.mark.parametrize("limit", [0, -5, 101])
+def test_out_of_range_feed_limits_are_rejected(limit):
+    response = client.request("GET", "/getPostRecommendations", json={"username": "user", "limit": limit})
+    assert response.status_code == 422
@@ -0,0 +1,70 @@
+import asyncio
+import datetime
+
+import neo4j.time
+import pytest
+
+from DBController import DBController
+
+
+class Record(dict):
+    def data(self):
+        return dict(self)
+
+
+class FakeQueryManager:
+    """Serves a feed per username from memory, rebuild_user_feed fills a user's feed from their interest threads."""
+
+    def __init__(self, built, feed, interest_threads):
+        self.built = built
+        self.feed = feed
+        self.interest_threads = interest_threads
+        self.rebuilt = []
+
+    async def get_feed_built(self, json):
+        if json['username'] not in self.built:
+            return []
+        return [Record(built=self.built[json['username']])]
+
+    async def rebuild_user_feed(self, json):
+        self.rebuilt.append(json['username'])
+        self.built[json['username']] = True
+        self.feed[json['username']] = list(self.interest_threads)
+        return [Record(items=len(self.interest_threads))]
+
+    async def get_feed(self, json):
+        return [Record(thread) for thread in self.feed.get(json['username'], [])[:json['limit']]]
+
+
+def thread(threadid, score):
+    return {
+        'threadid': threadid, 'title': threadid, 'username': 'author', 'score': score,
+        'datetime': neo4j.time.DateTime.from_native(datetime.datetime(2025, 1, 1)),
+    }
+
+
+@pytest.fixture
+def db():
+    db = DBController()
+    database = db.qm.db
+    yield db
+    asyncio.run(database.close())
+
+
+def test_feed_is_built_on_first_read_for_users_from_before_feeds(db):
+    fanned_out = [thread('new', 3.0)]
+    db.qm = FakeQueryManager({'old': False}, {'old': fanned_out}, [thread('new', 3.0), thread('older', 2.0)])
+
+    res = asyncio.run(db.get_feed({'username': 'old'}))
+
+    assert db.qm.rebuilt == ['old']
+    assert [t['threadid'] for t in res['threads']] == ['new', 'older']
+
+
+def test_built_feed_is_read_as_is(db):
+    db.qm = FakeQueryManager({'user': True}, {'user': [thread('a', 1.0)]}, [thread('a', 1.0), thread('b', 0.5)])
+
+    res = asyncio.run(db.get_feed({'username': 'user'}))
+
+    assert db.qm.rebuilt == []
+    assert [t['threadid'] for t in res['threads']] == ['a']
@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+import EventPipeline as event_pipeline
+from EventPipeline import EventPipeline
+from ReferenceCache import ReferenceCache
+
+
+class FakeEventManager:
+    def __init__(self, reference_cache):
+        self.known_event_ids = set()
+        self.reference_cache = reference_cache
+
+    async def get_event_details(self, eventid):
+        return {'eventid': eventid, 'content_hash': f"c{eventid}", 'embed_hash': f"e{eventid}"}
+
+
+class FakeDB:
+    async def get_event_hashes(self, json):
+        return {'success': True, 'hashes': {}}
+
+    async def create_or_update_event(self, json):
+        return {'success': True}
+
+    async def set_event_embed_hashes(self, json):
+        return {'success': True}
+
+    async def expire_events(self, json):
+        return {'success': True, 'expired': 0}
+
+
+def make_pipeline(tmp_path, embed_fn=None):
+    async def embed(events):
+        return True
+
+    return EventPipeline(
+        FakeEventManager(ReferenceCache(str(tmp_path / "reference_cache.sqlite3"))), FakeDB(), lambda lat, long: None, embed_fn or embed,
+        checkpoint_path=str(tmp_path / "checkpoint"),
+    )
+
+
+@pytest.fixture
+def crawls(monkeypatch):
+    crawls = []
+
+    async def discover_event_ids(known_ids=frozenset()):
+        crawls.append(set(known_ids))
+        return ["1", "2", "3"]
+
+    monkeypatch.setattr(event_pipeline, "discover_event_ids", discover_event_ids)
+    return crawls
+
+
+def test_run_streams_every_discovered_event(tmp_path, crawls):
+    stats = asyncio.run(make_pipeline(tmp_path).run())
+
+    assert stats['discovered'] == 3
+    assert stats['written'] == 3
+    assert stats['embedded'] == 3
+    assert not (tmp_path / "checkpoint").exists()
+
+
+def test_discovery_crawls_everything_when_full_crawl_is_due(tmp_path, crawls):
+    pipeline = make_pipeline(tmp_path)
+
+    first = asyncio.run(pipeline.run())
+    second = asyncio.run(pipeline.run())
+    pipeline.last_full_crawl -= pipeline.full_crawl_seconds
+    third = asyncio.run(pipeline.run())
+
+    assert crawls == [set(), {"1", "2", "3"}, set()]
+    assert [first['full_crawl'], second['full_crawl'], third['full_crawl']] == [True, False, True]
+
+
+def test_failing_stage_cancels_the_others(tmp_path, crawls):
+    async def embed(events):
+        raise RuntimeError("vector db down")
+
+    async def run():
+        pipeline = make_pipeline(tmp_path, embed)
+        # with one-item queues the write stage is left blocked on the queue the dead embed stage no longer reads
+        pipeline.queue_size = 1
+        pipeline.embed_batch_size = 1
+        with pytest.raises(RuntimeError, match="vector db down"):
+            await pipeline.run()
+        return [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+
+    assert asyncio.run(run()) == []
+
+
+def test_run_purges_expired_reference_rows(tmp_path, crawls):
+    pipeline = make_pipeline(tmp_path)
+    pipeline.em.reference_cache.ttls["venues"] = -1
+    pipeline.em.reference_cache.set("venues", 1, {"name": "Old hall"})
+
+    assert asyncio.run(pipeline.run())['purged_references'] == 1
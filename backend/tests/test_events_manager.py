@@ -0,0 +1,24 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+
+from EventsManager import retry_after_seconds
+
+
+def test_retry_after_seconds_reads_delay_seconds():
+    assert retry_after_seconds("7", 1) == 7.0
+
+
+def test_retry_after_seconds_reads_http_date():
+    retry_at = datetime.now(timezone.utc) + timedelta(seconds=30)
+    assert retry_after_seconds(format_datetime(retry_at, usegmt=True), 1) == pytest.approx(30, abs=2)
+
+
+def test_retry_after_seconds_does_not_go_negative_for_past_date():
+    assert retry_after_seconds("Wed, 21 Oct 2015 07:28:00 GMT", 1) == 0.0
+
+
+@pytest.mark.parametrize("value", [None, "", "soon"])
+def test_retry_after_seconds_falls_back_to_default(value):
+    assert retry_after_seconds(value, 4) == 4
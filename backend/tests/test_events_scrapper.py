@@ -0,0 +1,101 @@
+import asyncio
+import os
+from urllib.parse import urlsplit
+
+import httpx
+import pytest
+
+from EventsScrapper import EventSource, EventbriteSource, discover_event_ids, parse_eventbrite_event_ids
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+BASE_URL = "https://www.eventbrite.test/d/singapore--singapore"
+
+
+def fixture(name):
+    with open(os.path.join(FIXTURES, name)) as f:
+        return f.read()
+
+
+def listing_client(pages_by_facet, requested):
+    """
+    Returns a client serving pages_by_facet[category] (a list of fixture names, one per page) and recording every
+    (category, page) requested. Pages past the end of a facet are empty, like Eventbrite's.
+    """
+    def handler(request):
+        category = urlsplit(str(request.url)).path.rstrip("/").rsplit("/", 1)[-1]
+        page = int(request.url.params.get("page", 1))
+        requested.append((category, page))
+        pages = pages_by_facet[category]
+        name = pages[page - 1] if page <= len(pages) else "eventbrite_page_empty.html"
+        return httpx.Response(200, text=fixture(name))
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+def crawl(source, pages_by_facet, known_ids=frozenset(), max_pages=50, page_concurrency=1):
+    requested = []
+
+    async def run():
+        async with listing_client(pages_by_facet, requested) as client:
+            return await source.crawl_facet(
+                client, source.facets()[0], known_ids, max_pages, page_concurrency
+            )
+
+    return asyncio.run(run()), requested
+
+
+def test_parse_eventbrite_event_ids_keeps_page_order_without_duplicates():
+    assert parse_eventbrite_event_ids(fixture("eventbrite_page_1.html")) == ["1001", "1002", "1003"]
+    assert parse_eventbrite_event_ids(fixture("eventbrite_page_empty.html")) == []
+
+
+def test_event_source_is_abstract():
+    with pytest.raises(TypeError):
+        EventSource()
+
+
+def test_crawl_facet_stops_at_end_of_pagination():
+    source = EventbriteSource(base_url=BASE_URL, categories=["events"])
+    event_ids, requested = crawl(source, {"events": ["eventbrite_page_1.html", "eventbrite_page_2.html"]})
+
+    assert event_ids == ["1001", "1002", "1003", "1004", "1005"]
+    assert requested == [("events", 1), ("events", 2), ("events", 3)]
+
+
+def test_crawl_facet_stops_at_page_of_known_ids():
+    source = EventbriteSource(base_url=BASE_URL, categories=["events"])
+    pages = ["eventbrite_page_1.html", "eventbrite_page_2.html", "eventbrite_page_other_facet.html"]
+    event_ids, requested = crawl(source, {"events": pages}, known_ids={"1004", "1005"})
+
+    assert event_ids == ["1001", "1002", "1003", "1004", "1005"]
+    assert requested == [("events", 1), ("events", 2)]
+
+
+def test_crawl_facet_respects_max_pages():
+    source = EventbriteSource(base_url=BASE_URL, categories=["events"])
+    event_ids, requested = crawl(
+        source, {"events": ["eventbrite_page_1.html", "eventbrite_page_2.html"]}, max_pages=1, page_concurrency=4
+    )
+
+    assert event_ids == ["1001", "1002", "1003"]
+    assert requested == [("events", 1)]
+
+
+def test_discover_event_ids_deduplicates_across_facets():
+    source = EventbriteSource(base_url=BASE_URL)
+    assert len(source.facets()) == 7
+    pages_by_facet = {
+        category.rstrip("/"): ["eventbrite_page_1.html", "eventbrite_page_2.html"] if i % 2 == 0
+        else ["eventbrite_page_other_facet.html"]
+        for i, category in enumerate(source.categories)
+    }
+    requested = []
+
+    async def run():
+        async with listing_client(pages_by_facet, requested) as client:
+            return await discover_event_ids([source], client=client)
+
+    event_ids = asyncio.run(run())
+
+    assert event_ids == ["1001", "1002", "1003", "1004", "1005", "1006"]
+    assert {category for category, _ in requested} == set(pages_by_facet)
@@ -0,0 +1,27 @@
+import asyncio
+
+import pytest
+
+from PasswordHasher import PasswordHasher
+
+
+@pytest.fixture
+def hasher(monkeypatch):
+    monkeypatch.setenv("BCRYPT_ROUNDS", "4")
+    hasher = PasswordHasher()
+    yield hasher
+    hasher.shutdown()
+
+
+def test_verify_matches_hashed_password(hasher):
+    async def run():
+        hashed = await hasher.hash("correct horse")
+        return await hasher.verify("correct horse", hashed), await hasher.verify("wrong horse", hashed)
+
+    assert asyncio.run(run()) == (True, False)
+
+
+@pytest.mark.parametrize("stored", ["correct horse", b"", "$2b$04$truncated"])
+def test_verify_rejects_stored_value_that_is_not_a_bcrypt_hash(hasher, stored):
+    assert asyncio.run(hasher.verify("correct horse", stored)) is False
+    assert hasher.in_flight == 0
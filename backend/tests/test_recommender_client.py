@@ -0,0 +1,79 @@
+import asyncio
+
+import httpx
+import pytest
+
+from RecommenderClient import CircuitBreaker, CircuitOpenError, RecommenderClient
+
+URL = "http://recommender.test/recommend"
+
+
+def half_open_client(handler, monkeypatch):
+    monkeypatch.setenv("RECOMMENDER_FAILURE_THRESHOLD", "1")
+    monkeypatch.setenv("RECOMMENDER_RESET_TIMEOUT", "0")
+    monkeypatch.setenv("RECOMMENDER_RETRIES", "0")
+    client = RecommenderClient()
+    client.clients["http://recommender.test"] = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    breaker = client._breaker("http://recommender.test")
+    breaker.record_failure()
+    assert breaker.state == "half_open"
+    return client, breaker
+
+
+def test_breaker_lets_one_trial_through_when_half_open():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+
+    assert breaker.allow() is True
+    assert breaker.allow() is False
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_cancelled_trial_frees_the_trial_slot(monkeypatch):
+    started = asyncio.Event()
+
+    async def handler(request):
+        started.set()
+        await asyncio.sleep(60)
+
+    async def run():
+        client, breaker = half_open_client(handler, monkeypatch)
+        trial = asyncio.create_task(client.post(URL, {}))
+        await started.wait()
+        assert breaker.trial_in_flight
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+        await client.close()
+        return breaker
+
+    breaker = asyncio.run(run())
+    assert breaker.trial_in_flight is False
+    assert breaker.allow() is True
+
+
+def test_trial_failing_with_non_transport_error_frees_the_trial_slot(monkeypatch):
+    def handler(request):
+        raise httpx.DecodingError("bad body", request=request)
+
+    async def run():
+        client, breaker = half_open_client(handler, monkeypatch)
+        with pytest.raises(httpx.DecodingError):
+            await client.post(URL, {})
+        with pytest.raises(httpx.DecodingError):
+            await client.post(URL, {})
+        await client.close()
+        return breaker
+
+    assert asyncio.run(run()).trial_in_flight is False
+
+
+def test_open_circuit_refuses_requests(monkeypatch):
+    monkeypatch.setenv("RECOMMENDER_RESET_TIMEOUT", "60")
+    monkeypatch.setenv("RECOMMENDER_FAILURE_THRESHOLD", "1")
+    client = RecommenderClient()
+    client._breaker("http://recommender.test").record_failure()
+
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(client.post(URL, {}))
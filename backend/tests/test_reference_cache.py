@@ -0,0 +1,28 @@
+from ReferenceCache import ReferenceCache
+
+
+def test_stats_count_hits_and_misses_per_entity_type(tmp_path):
+    cache = ReferenceCache(str(tmp_path / "reference_cache.sqlite3"))
+    cache.set("venues", 1, {"name": "Hall"})
+
+    assert cache.get("venues", 1) == {"name": "Hall"}
+    assert cache.get("venues", 2) is None
+    assert cache.get("organizers", 3) is None
+
+    stats = cache.stats()
+    cache.close()
+    assert stats["venues"] == {"hits": 1, "misses": 1, "hit_rate": 0.5}
+    assert stats["organizers"] == {"hits": 0, "misses": 1, "hit_rate": 0.0}
+    assert stats["categories"] == {"hits": 0, "misses": 0, "hit_rate": 0.0}
+
+
+def test_purge_expired_deletes_only_expired_rows(tmp_path):
+    cache = ReferenceCache(str(tmp_path / "reference_cache.sqlite3"))
+    cache.ttls["venues"] = -1
+    cache.set("venues", 1, {"name": "Old hall"})
+    cache.set("organizers", 2, {"name": "Organizer"})
+
+    assert cache.purge_expired() == 1
+    rows = cache.conn.execute("SELECT entity_type, entity_id FROM reference").fetchall()
+    cache.close()
+    assert rows == [("organizers", "2")]
@@ -0,0 +1,52 @@
+import asyncio
+
+from SchemaManager import SchemaManager, local_utc_offset
+
+
+class FakeDatabase:
+    """Records statements, and which ones ran in auto-commit transactions, and keeps (:Migration) names."""
+
+    def __init__(self, fail=()):
+        self.fail = fail
+        self.migrations = set()
+        self.managed = []
+        self.auto_commit = []
+
+    async def execute_query(self, query, params, read=False):
+        self.managed.append(query)
+        if query.startswith("MATCH (m:Migration)"):
+            return [{"name": name} for name in self.migrations]
+        if query.startswith("MERGE (m:Migration"):
+            self.migrations.add(params["name"])
+        return []
+
+    async def execute_auto_commit(self, query, params):
+        self.auto_commit.append((query, params))
+        if any(name in query for name in self.fail):
+            raise Exception("backfill failed")
+
+
+def test_backfills_run_in_batched_auto_commit_transactions():
+    db = FakeDatabase()
+    res = asyncio.run(SchemaManager(db).migrate())
+
+    assert res["success"]
+    assert len(db.auto_commit) == len(SchemaManager.BACKFILLS)
+    for query, params in db.auto_commit:
+        assert "IN TRANSACTIONS OF 10000 ROWS" in query
+        assert params == {"timezone": local_utc_offset()}
+    assert not any("IN TRANSACTIONS" in query for query in db.managed)
+    assert db.migrations == set(SchemaManager.BACKFILLS)
+
+
+def test_applied_backfills_are_skipped_on_the_next_start():
+    db = FakeDatabase(fail=("e.location",))
+    first = asyncio.run(SchemaManager(db).migrate())
+    assert first["failed"] == ["event_location"]
+
+    db.fail, db.auto_commit = (), []
+    second = asyncio.run(SchemaManager(db).migrate())
+
+    assert second["success"]
+    assert [query for query, _ in db.auto_commit] == [SchemaManager.BACKFILLS["event_location"]]
+    assert set(second["skipped"]) == set(SchemaManager.BACKFILLS) - {"event_location"}
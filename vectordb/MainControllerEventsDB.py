@@ -52,16 +52,24 @@ def health_check():
     return {"status": "ok"}
 
 
+@app.get("/metrics")
+def metrics():
+    return {
+        "embedding_cache": DescriptionDB.embedding_cache.stats() if DescriptionDB.embedding_cache is not None else None,
+        "index": DescriptionDB.collection.stats() if hasattr(DescriptionDB.collection, "stats") else None,
+    }
+
+
 @app.post("/get_user_related_events")
 def user_query_event(query: DescriptionQuery):
-    dict = {}
     user_dicts, user_ids, top_n = query.contents, query.ids, query.top_n
     sys_prompt = """
         You will recieve a python dictionary specifying the details of a person.
         Output the most likely type of event that this user would be interested in attending.
         Format your output in a short paragraph (at most 100 words) describing such an event.
     """
-    for user_dict, user_id in zip(user_dicts, user_ids):
+    queries = []
+    for user_dict in user_dicts:
         response = ollama.chat(
             model=LLM,
             messages=[
@@ -70,12 +78,9 @@ def user_query_event(query: DescriptionQuery):
         )
         query = response.message.content.split('</think>')[-1]
         print(query)
-        id_distances_list = DescriptionDB.retrieve_distance_text_pairs(
-            query=query, top_n=top_n
-        )
-        dict[user_id] = id_distances_list
+        queries.append(query)
 
-    return dict
+    return DescriptionDB.retrieve_many(ids=user_ids, queries=queries, top_n=top_n)
 
 
 @app.post("/store_events")
@@ -87,8 +92,8 @@ def event_embed(query: DescriptionQuery):
         reasoning. Do not hallucinate properties about the event. Output
         a paragraph (at most 100 words) summarizing the event.
     """
-    response = []
-    for event_dict, event_id in zip(event_dicts, event_ids):
+    summaries = []
+    for event_dict in event_dicts:
         response = ollama.chat(
             model=LLM,
             messages=[
@@ -97,7 +102,8 @@ def event_embed(query: DescriptionQuery):
         )
         query = response.message.content.split('</think>')[-1]
         print(query)
-        DescriptionDB.add(id=event_id, query=query)
+        summaries.append(query)
+    return DescriptionDB.add_many(ids=event_ids, queries=summaries)
 
 
 # Main entry point for running the app
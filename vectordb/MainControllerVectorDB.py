@@ -2,7 +2,7 @@ import sys
 import os
 import uvicorn
 
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 from typing import List, Optional, Union
 
@@ -16,6 +16,7 @@ class Query(BaseModel):
     top_n: Optional[int] = None
     condition_dict: Optional[dict] = None # tel the boys about this?
     ids: list[str]
+    weights: Optional[List[List[float]]] = None # per interest weightage, aligned with contents
 
 @app.on_event("startup")
 async def startup():
@@ -24,6 +25,10 @@ async def startup():
     COLLECTION_NAME = "interests"
     EMBEDDER = os.getenv("EMBEDDER", "mxbai-embed-large")
     DISTANCE_TYPE = os.getenv("DISTANCE_TYPE", "ip")
+    # "joined": embed the joined interests of a user as one string
+    # "pooled": weighted pooling of per-interest embeddings (changing modes needs the collection to be re-stored)
+    global INTEREST_COMPOSITION
+    INTEREST_COMPOSITION = os.getenv("INTEREST_COMPOSITION", "joined")
 
     global VECTORDB # horrible!
     # We assume ollama is running defaultly on the host machine
@@ -37,24 +42,52 @@ def health_check():
     return {"status": "ok"}
 
 
+@app.get("/metrics")
+def metrics():
+    return {
+        "embedding_cache": VECTORDB.embedding_cache.stats() if VECTORDB.embedding_cache is not None else None,
+        "index": VECTORDB.collection.stats() if hasattr(VECTORDB.collection, "stats") else None,
+    }
+
+
+def check_weights(query: Query):
+    if query.weights is not None and [len(w) for w in query.weights] != [len(c) for c in query.contents]:
+        raise HTTPException(status_code=400, detail="weights must have one weight per interest in contents.")
+
+
 @app.post("/retrieve/")
 def retrieve(query: Query):
-    dict = {}
-    queries, top_n = query.contents, query.top_n
+    """
+    Returns the nearest stored ids of every query, keyed by the query's id in ids.
+    """
+    queries, ids, top_n = query.contents, query.ids, query.top_n
     assert isinstance(top_n, int), f'top_n is not an integer! Got top_n: {top_n}'
-    for query in queries:
-        query = " ".join(query)
-        id_distances_list = VECTORDB.retrieve_distance_text_pairs(query=query, top_n=top_n)
-        dict[query] = id_distances_list
-    return dict
+    if len(ids) != len(queries):
+        raise HTTPException(status_code=400, detail="ids must have one id per query in contents.")
+    if INTEREST_COMPOSITION == "pooled":
+        check_weights(query)
+        keep = [i for i, interests in enumerate(queries) if interests]
+        if not keep:
+            return {id: [] for id in ids}
+        vectors = VECTORDB.compose([queries[i] for i in keep], [query.weights[i] for i in keep] if query.weights else None)
+        results = VECTORDB.retrieve_many(ids=[ids[i] for i in keep], top_n=top_n, embeddings=vectors)
+        return {id: results.get(id, []) for id in ids}
+    return VECTORDB.retrieve_many(ids=ids, queries=[" ".join(query) for query in queries], top_n=top_n)
 
 @app.post("/store/")
 def store(query: Query):
     queries, ids = query.contents, query.ids # here .content returns list of list of str
-    for query, id in zip(queries, ids):
-        query = ' '.join(query)
-        VECTORDB.add(id=id, query=query) # batch add instead? who cares lol
-    return "<3" # surely gerard wont use this!
+    if INTEREST_COMPOSITION == "pooled":
+        check_weights(query)
+        keep = [i for i, interests in enumerate(queries) if interests]
+        if not keep:
+            return VECTORDB.add_many(ids=[], queries=[])
+        vectors = VECTORDB.compose([queries[i] for i in keep], [query.weights[i] for i in keep] if query.weights else None)
+        return VECTORDB.add_many(
+            ids=[ids[i] for i in keep], queries=[' '.join(sorted(queries[i])) for i in keep], embeddings=vectors
+        )
+    queries = [' '.join(query) for query in queries]
+    return VECTORDB.add_many(ids=ids, queries=queries)
 
 # Main entry point for running the app
 if __name__ == "__main__":
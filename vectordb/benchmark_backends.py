@@ -0,0 +1,103 @@
+"""
+Benchmarks the numpy exact-search backend on random vectors, without an embedder, optionally against chroma:
+
+    python benchmark_backends.py --items 20000 --dim 1024 --queries 200 --top-n 10 --space ip --quantization int8 binary --chroma
+
+Reports insert time, single query latency, batched query throughput, bytes per vector of the search index and
+recall@k against the exact results of every quantized numpy index and, with --chroma, of chroma's HNSW index.
+"""
+import argparse
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from numpy_index import NumpyCollection
+
+
+def random_vectors(n, dim, rng):
+    vectors = rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def bench(name, collection, ids, vectors, queries, top_n, batch_size):
+    start = time.perf_counter()
+    for i in range(0, len(ids), batch_size):
+        collection.upsert(ids=ids[i:i + batch_size], embeddings=vectors[i:i + batch_size].tolist())
+    insert_seconds = time.perf_counter() - start
+
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        collection.query(query_embeddings=[query.tolist()], n_results=top_n)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    results = collection.query(query_embeddings=queries.tolist(), n_results=top_n)
+    batch_seconds = time.perf_counter() - start
+
+    print(
+        f"{name:>6}: insert {insert_seconds:.2f}s, single query p50 {1000 * np.percentile(latencies, 50):.2f}ms "
+        f"p95 {1000 * np.percentile(latencies, 95):.2f}ms, batch of {len(queries)} {1000 * batch_seconds:.1f}ms "
+        f"({len(queries) / batch_seconds:.0f} queries/s)"
+    )
+    return results["ids"]
+
+
+def recall_at_k(results, exact):
+    return float(np.mean([len(set(r) & set(e)) / len(e) for r, e in zip(results, exact) if e]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-n", type=int, default=10)
+    parser.add_argument("--space", default="ip", choices=["ip", "cosine", "l2"])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--quantization", nargs="*", default=[], choices=["int8", "binary"])
+    parser.add_argument("--rerank-factor", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chroma", action="store_true", help="also benchmark chroma, requires chromadb")
+    args = parser.parse_args()
+    if args.chroma:
+        try:
+            import chromadb
+            from chromadb.config import Settings
+        except ImportError:
+            parser.error("--chroma requires chromadb, install it or run without --chroma")
+
+    rng = np.random.default_rng(args.seed)
+    vectors = random_vectors(args.items, args.dim, rng)
+    queries = random_vectors(args.queries, args.dim, rng)
+    ids = [str(i) for i in range(args.items)]
+
+    path = tempfile.mkdtemp(prefix="vector_benchmark_")
+    try:
+        collection = NumpyCollection(f"{path}/numpy", space=args.space, quantization="none")
+        exact = bench("numpy", collection, ids, vectors, queries, args.top_n, args.batch_size)
+        print(f"{'':>6}  {collection.stats()['index_bytes_per_vector']} bytes per vector")
+        for quantization in args.quantization:
+            collection = NumpyCollection(
+                f"{path}/numpy_{quantization}", space=args.space, quantization=quantization, rerank_factor=args.rerank_factor
+            )
+            results = bench(quantization, collection, ids, vectors, queries, args.top_n, args.batch_size)
+            print(
+                f"{'':>6}  {collection.stats()['index_bytes_per_vector']} bytes per vector, "
+                f"recall@{args.top_n} against exact search: {recall_at_k(results, exact):.4f}"
+            )
+        if not args.chroma:
+            return
+        client = chromadb.PersistentClient(path=f"{path}/chroma", settings=Settings(anonymized_telemetry=False))
+        collection = client.get_or_create_collection(name="benchmark", metadata={"hnsw:space": args.space})
+        batch_size = min(args.batch_size, client.get_max_batch_size())
+        approximate = bench("chroma", collection, ids, vectors, queries, args.top_n, batch_size)
+        print(f"chroma recall@{args.top_n} against exact search: {recall_at_k(approximate, exact):.4f}")
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import hashlib
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+from memmap_matrix import MemmapMatrix
+
+
+def normalize_text(text):
+    """
+    Normalizes text before hashing so that inputs differing only in unicode form or whitespace share an entry.
+    Case is kept, the embedder can tell "Go" from "go".
+    """
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+class EmbeddingCache:
+    """
+    Content-addressed cache of embeddings keyed by (embedder model, hash of the normalized text).
+
+    Recently used vectors are kept in memory as an LRU, every vector is also spilled to a memory-mapped
+    float32 matrix on disk (one row per text, with the keys in an append-only file next to it), so the
+    cache survives restarts without loading all of it into RAM.
+    """
+
+    def __init__(self, path, model, memory_items=None, disk_items=None):
+        """
+        Params:
+            - path: directory to keep the on-disk store of this model in.
+            - model: embedder name, part of every key.
+            - memory_items: LRU size, defaults to the EMBEDDING_CACHE_MEMORY_ITEMS env var (10000).
+            - disk_items: max rows on disk, defaults to the EMBEDDING_CACHE_DISK_ITEMS env var (1000000).
+        """
+        self.path = path
+        self.model = model
+        self.memory_items = memory_items or int(os.getenv("EMBEDDING_CACHE_MEMORY_ITEMS", 10000))
+        self.disk_items = disk_items or int(os.getenv("EMBEDDING_CACHE_DISK_ITEMS", 1000000))
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.counts = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+        self.matrix = MemmapMatrix(path, "keys.txt", meta={"model": model})
+        self.rows = {key: row for row, key in enumerate(self.matrix.read_keys())}
+
+    def key(self, text):
+        return hashlib.sha256(f"{self.model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def get_many(self, texts):
+        """
+        Returns a list with the cached float32 vector of each text, or None where it is not cached.
+        """
+        results = []
+        with self.lock:
+            for text in texts:
+                key = self.key(text)
+                vector = self.memory.get(key)
+                if vector is not None:
+                    self.memory.move_to_end(key)
+                    self.counts["memory_hits"] += 1
+                elif key in self.rows:
+                    vector = np.array(self.matrix.vectors[self.rows[key]])
+                    self._remember(key, vector)
+                    self.counts["disk_hits"] += 1
+                else:
+                    self.counts["misses"] += 1
+                results.append(vector)
+        return results
+
+    def put_many(self, texts, vectors):
+        with self.lock:
+            new_keys = []
+            for text, vector in zip(texts, vectors):
+                key = self.key(text)
+                vector = np.asarray(vector, dtype=np.float32)
+                self._remember(key, vector)
+                if key not in self.rows and len(self.rows) < self.disk_items:
+                    self._spill(key, vector)
+                    new_keys.append(key)
+            if new_keys:
+                self.matrix.append_keys(new_keys)
+
+    def _remember(self, key, vector):
+        self.memory[key] = vector
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_items:
+            self.memory.popitem(last=False)
+
+    def _spill(self, key, vector):
+        row = len(self.rows)
+        self.matrix.reserve(row + 1, len(vector), max_capacity=self.disk_items)
+        self.matrix.vectors[row] = vector
+        self.rows[key] = row
+
+    def stats(self):
+        lookups = sum(self.counts.values())
+        hits = self.counts["memory_hits"] + self.counts["disk_hits"]
+        return {
+            **self.counts,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "memory_items": len(self.memory),
+            "disk_items": len(self.rows),
+        }
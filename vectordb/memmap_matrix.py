@@ -0,0 +1,84 @@
+import json
+import os
+
+import numpy as np
+
+
+class MemmapMatrix:
+    """
+    Growable float32 matrix memory-mapped from a file on disk, with one key per used row in an append-only text
+    file next to it and the matrix shape in a json file. Used by the embedding cache and the numpy vector index.
+
+    Rows are written (and flushed) before their keys are appended, a crash in between leaves unused rows
+    instead of keys that point at unwritten rows.
+    """
+
+    def __init__(self, path, keys_file, meta=None, initial_capacity=1024):
+        """
+        Params:
+            - path: directory to keep the matrix (vectors.f32), keys (keys_file) and shape (meta.json) in.
+            - keys_file: name of the keys file.
+            - meta: extra fields written to meta.json, e.g. the embedder model or distance space.
+            - initial_capacity: rows allocated when the first rows are reserved.
+        """
+        os.makedirs(path, exist_ok=True)
+        self.meta_path = os.path.join(path, "meta.json")
+        self.keys_path = os.path.join(path, keys_file)
+        self.vectors_path = os.path.join(path, "vectors.f32")
+        self.meta = meta or {}
+        self.initial_capacity = initial_capacity
+        self.dim = None
+        self.vectors = None
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+            self.dim = meta["dim"]
+            self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(meta["capacity"], self.dim))
+
+    def read_keys(self):
+        """
+        Returns the stored keys, the key of row i at index i.
+        """
+        if not os.path.exists(self.keys_path):
+            return []
+        with open(self.keys_path) as f:
+            return [line.rstrip("\n") for line in f]
+
+    @property
+    def capacity(self):
+        return 0 if self.vectors is None else len(self.vectors)
+
+    def reserve(self, rows, dim, max_capacity=None):
+        """
+        Makes room for rows rows of dim floats, doubling the file when it grows (up to max_capacity rows).
+        The first call fixes dim, a different dim later raises ValueError.
+        """
+        if self.dim is None:
+            self.dim = dim
+        elif dim != self.dim:
+            raise ValueError(f"Embedding dimension {dim} does not match dimensionality {self.dim}")
+        if rows <= self.capacity:
+            return
+        capacity = max(rows, 2 * self.capacity if self.vectors is not None else self.initial_capacity)
+        if max_capacity is not None:
+            capacity = max(rows, min(capacity, max_capacity))
+        self._resize(capacity)
+
+    def _resize(self, capacity):
+        if self.vectors is not None:
+            self.vectors.flush()
+            del self.vectors
+        with open(self.vectors_path, "ab") as f:
+            f.truncate(capacity * self.dim * np.dtype(np.float32).itemsize)
+        self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+        with open(self.meta_path, "w") as f:
+            json.dump({**self.meta, "dim": self.dim, "capacity": capacity}, f)
+
+    def append_keys(self, keys):
+        """
+        Flushes the written rows, then records keys as the keys of the next rows.
+        """
+        self.vectors.flush()
+        if keys:
+            with open(self.keys_path, "a") as f:
+                f.writelines(f"{key}\n" for key in keys)
@@ -0,0 +1,341 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+from memmap_matrix import MemmapMatrix
+
+if hasattr(np, "bitwise_count"):
+    _popcount = np.bitwise_count
+else:
+    _POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def _popcount(values):
+        return _POPCOUNT[values]
+
+
+class NumpyCollection:
+    """
+    Exact nearest neighbour search over a contiguous float32 matrix, memory-mapped from disk, with the ids
+    in an array alongside. Implements the part of chromadb's Collection that VectorDB uses (upsert, query,
+    count), with the same distances per space:
+
+        ip:     1 - q.x
+        cosine: 1 - q.x / (|q| |x|)
+        l2:     |q - x|^2
+
+    A query is one matmul of all query vectors against the matrix plus an argpartition for the top k.
+
+    With quantization, the first pass instead runs over compact codes kept in RAM, int8 (1 byte per dimension
+    plus a scale per vector, 4x smaller) or binary signs (1 bit per dimension, 32x smaller), and only the
+    rerank_factor * k best candidates are re-ranked exactly against their float32 rows, which stay on disk.
+
+    Metadata is also kept as one object array per key, row aligned with the matrix, so a where filter is an
+    elementwise comparison per key. records.jsonl is append-only and is rewritten with only the latest record
+    of every id once more than COMPACT_DEAD_RATIO of its lines are superseded.
+    """
+    QUANTIZATIONS = ("none", "int8", "binary")
+    CHUNK_ROWS = 16384
+    COMPACT_MIN_LINES = 1024
+    COMPACT_DEAD_RATIO = 0.5
+
+    def __init__(self, path, space="ip", quantization=None, rerank_factor=None):
+        """
+        Params:
+            - path: directory to keep the matrix (vectors.f32), ids (ids.txt) and documents/metadatas (records.jsonl) in.
+            - space: ip, cosine or l2 like chroma's hnsw:space.
+            - quantization: none, int8 or binary, defaults to the VECTOR_QUANTIZATION env var (none).
+            - rerank_factor: candidates per result that are re-ranked exactly, defaults to the
+              VECTOR_RERANK_FACTOR env var (10).
+        """
+        if space not in ("ip", "cosine", "l2"):
+            raise ValueError(f"Unsupported space: {space}")
+        self.quantization = quantization or os.getenv("VECTOR_QUANTIZATION", "none")
+        if self.quantization not in self.QUANTIZATIONS:
+            raise ValueError(f"Unsupported quantization: {self.quantization}")
+        self.rerank_factor = rerank_factor or int(os.getenv("VECTOR_RERANK_FACTOR", 10))
+        self.path = path
+        self.space = space
+        self.lock = threading.Lock()
+        self.matrix = MemmapMatrix(path, "ids.txt", meta={"space": space})
+        self.records_path = os.path.join(path, "records.jsonl")
+
+        self.ids = self.matrix.read_keys()
+        self.rows = {id: row for row, id in enumerate(self.ids)}
+        self.documents = {}
+        self.metadatas = {}
+        self.columns = {}
+        self.record_lines = 0
+        self.sq_norms = np.zeros(0, dtype=np.float32)
+        self.codes = None
+        self.scales = np.zeros(0, dtype=np.float32)
+        if self.vectors is not None:
+            self.sq_norms = np.einsum("ij,ij->i", self.vectors[:len(self.ids)], self.vectors[:len(self.ids)])
+            if self.quantization != "none":
+                self._grow_codes(len(self.vectors))
+                for start in range(0, len(self.ids), self.CHUNK_ROWS):
+                    end = min(start + self.CHUNK_ROWS, len(self.ids))
+                    self.codes[start:end], self.scales[start:end] = self._quantize(self.vectors[start:end])
+            if os.path.exists(self.records_path):
+                with open(self.records_path) as f:
+                    for line in f:
+                        record = json.loads(line)
+                        self.documents[record["id"]] = record["document"]
+                        self.metadatas[record["id"]] = record["metadata"]
+                        self.record_lines += 1
+            recorded = [id for id in self.ids if id in self.metadatas]
+            self._set_columns(
+                np.fromiter((self.rows[id] for id in recorded), dtype=np.intp, count=len(recorded)),
+                [self.metadatas[id] for id in recorded],
+            )
+            self._compact_if_needed()
+
+    @property
+    def vectors(self):
+        return self.matrix.vectors
+
+    @property
+    def dim(self):
+        return self.matrix.dim
+
+    def count(self):
+        return len(self.ids)
+
+    def stats(self):
+        return {
+            "items": len(self.ids),
+            "dim": self.dim,
+            "space": self.space,
+            "quantization": self.quantization,
+            "index_bytes_per_vector": self._index_bytes_per_vector(),
+            "record_lines": self.record_lines,
+        }
+
+    def _index_bytes_per_vector(self):
+        if self.dim is None:
+            return None
+        if self.quantization == "int8":
+            return self.dim + 4
+        if self.quantization == "binary":
+            return (self.dim + 7) // 8
+        return 4 * self.dim
+
+    def _quantize(self, embeddings):
+        """
+        Returns the codes and (for int8) per vector scales of float32 embeddings of shape (n, dim).
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if self.quantization == "binary":
+            return np.packbits(embeddings > 0, axis=1), np.zeros(len(embeddings), dtype=np.float32)
+        scales = np.maximum(np.abs(embeddings).max(axis=1), 1e-12) / 127.0
+        return np.round(embeddings / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+    def _grow_codes(self, capacity):
+        width = (self.dim + 7) // 8 if self.quantization == "binary" else self.dim
+        codes = np.zeros((capacity, width), dtype=np.uint8 if self.quantization == "binary" else np.int8)
+        scales = np.zeros(capacity, dtype=np.float32)
+        if self.codes is not None:
+            codes[:len(self.codes)] = self.codes
+            scales[:len(self.scales)] = self.scales
+        self.codes, self.scales = codes, scales
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None):
+        ids = [ids] if isinstance(ids, str) else list(ids)
+        documents = [documents] if isinstance(documents, str) else documents
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1)
+        with self.lock:
+            if self.dim is not None and embeddings.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {embeddings.shape[1]} does not match collection dimensionality {self.dim}")
+
+            new_ids = [id for id in dict.fromkeys(ids) if id not in self.rows]
+            self.matrix.reserve(len(self.ids) + len(new_ids), embeddings.shape[1])
+            for id in new_ids:
+                self.rows[id] = len(self.ids)
+                self.ids.append(id)
+            rows = np.fromiter((self.rows[id] for id in ids), dtype=np.intp, count=len(ids))
+            self.vectors[rows] = embeddings
+            if len(self.sq_norms) < len(self.ids):
+                self.sq_norms = np.concatenate([self.sq_norms, np.zeros(len(self.ids) - len(self.sq_norms), dtype=np.float32)])
+            self.sq_norms[rows] = np.einsum("ij,ij->i", embeddings, embeddings)
+            if self.quantization != "none":
+                if self.codes is None or len(self.codes) < len(self.vectors):
+                    self._grow_codes(len(self.vectors))
+                self.codes[rows], self.scales[rows] = self._quantize(embeddings)
+            self.matrix.append_keys(new_ids)
+            with open(self.records_path, "a") as f:
+                for i, id in enumerate(ids):
+                    record = {
+                        "id": id,
+                        "document": documents[i] if documents is not None else None,
+                        "metadata": metadatas[i] if metadatas is not None else None,
+                    }
+                    self.documents[id], self.metadatas[id] = record["document"], record["metadata"]
+                    f.write(json.dumps(record) + "\n")
+            self.record_lines += len(ids)
+            self._set_columns(rows, metadatas if metadatas is not None else [None] * len(ids))
+            self._compact_if_needed()
+
+    def _set_columns(self, rows, metadatas):
+        """
+        Writes metadatas into the metadata columns at rows, keys a metadata does not have are set to None.
+        """
+        capacity = len(self.vectors) if self.vectors is not None else 0
+        for key in {key for metadata in metadatas if metadata for key in metadata}:
+            if key not in self.columns:
+                self.columns[key] = np.full(capacity, None, dtype=object)
+        for key, column in self.columns.items():
+            if len(column) < capacity:
+                column = self.columns[key] = np.concatenate([column, np.full(capacity - len(column), None, dtype=object)])
+            column[rows] = np.fromiter(((metadata or {}).get(key) for metadata in metadatas), dtype=object, count=len(rows))
+
+    def _compact_if_needed(self):
+        dead = self.record_lines - len(self.ids)
+        if self.record_lines >= self.COMPACT_MIN_LINES and dead > self.COMPACT_DEAD_RATIO * self.record_lines:
+            self._compact()
+
+    def compact(self):
+        """
+        Rewrites records.jsonl with only the latest record of every id.
+        """
+        with self.lock:
+            self._compact()
+
+    def _compact(self):
+        tmp_path = f"{self.records_path}.tmp"
+        with open(tmp_path, "w") as f:
+            for id in self.ids:
+                if id in self.metadatas:
+                    f.write(json.dumps({"id": id, "document": self.documents[id], "metadata": self.metadatas[id]}) + "\n")
+        os.replace(tmp_path, self.records_path)
+        self.record_lines = sum(id in self.metadatas for id in self.ids)
+
+    def _mask(self, where, n):
+        """
+        Rows whose metadata matches where, only equality filters ({key: value} or {key: {"$eq": value}}) are supported.
+        """
+        if not where:
+            return None
+        conditions = {key: value["$eq"] if isinstance(value, dict) and "$eq" in value else value for key, value in where.items()}
+        if any(isinstance(value, dict) for value in conditions.values()):
+            raise ValueError(f"Unsupported where filter: {where}")
+        mask = np.ones(n, dtype=bool)
+        for key, value in conditions.items():
+            column = self.columns.get(key)
+            if column is None:
+                mask &= value is None
+            else:
+                mask &= np.asarray(column[:n] == value, dtype=bool)
+        return mask
+
+    def _from_products(self, products, query_sq_norms, sq_norms):
+        """
+        Turns inner products of queries and vectors into distances of the collection's space.
+        """
+        if self.space == "ip":
+            return 1.0 - products
+        if self.space == "cosine":
+            return 1.0 - products / np.maximum(np.sqrt(query_sq_norms * sq_norms), 1e-12)
+        return np.maximum(query_sq_norms + sq_norms - 2.0 * products, 0.0)
+
+    def distances(self, query_embeddings, vectors, sq_norms):
+        """
+        Distances of every query to every vector, shape (number of queries, number of vectors).
+        """
+        queries = np.asarray(query_embeddings, dtype=np.float32).reshape(-1, vectors.shape[1])
+        query_sq_norms = np.einsum("ij,ij->i", queries, queries)[:, None]
+        return self._from_products(queries @ vectors.T, query_sq_norms, sq_norms[None, :])
+
+    def approximate_distances(self, queries, codes, scales, sq_norms):
+        """
+        First pass distances from the quantized codes, computed CHUNK_ROWS rows at a time so that only a chunk
+        is ever dequantized. For binary codes this is the hamming distance between sign bits, which ranks
+        like the angle between vectors.
+        """
+        distances = np.empty((len(queries), len(codes)), dtype=np.float32)
+        if self.quantization == "binary":
+            query_bits = np.packbits(queries > 0, axis=1)
+            if codes.shape[1] % 8 == 0:
+                # popcount 64 bits at a time
+                query_bits, codes = query_bits.view(np.uint64), codes.view(np.uint64)
+            for start in range(0, len(codes), self.CHUNK_ROWS):
+                chunk = codes[start:start + self.CHUNK_ROWS]
+                for q, bits in enumerate(query_bits):
+                    distances[q, start:start + len(chunk)] = _popcount(bits ^ chunk).sum(axis=1, dtype=np.int32)
+            return distances
+        query_sq_norms = np.einsum("ij,ij->i", queries, queries)[:, None]
+        for start in range(0, len(codes), self.CHUNK_ROWS):
+            end = min(start + self.CHUNK_ROWS, len(codes))
+            products = (queries @ codes[start:end].T.astype(np.float32)) * scales[None, start:end]
+            distances[:, start:end] = self._from_products(products, query_sq_norms, sq_norms[None, start:end])
+        return distances
+
+    def query(self, query_embeddings, n_results=10, where=None, exact=None):
+        """
+        Returns the n_results nearest ids of every query embedding like chromadb: {'ids': [[...]], 'distances': [[...]]}.
+        exact=True skips the quantized first pass, it defaults to True only without quantization.
+        """
+        with self.lock:
+            n = len(self.ids)
+            vectors, sq_norms, ids = self.vectors, self.sq_norms[:n], self.ids[:n]
+            codes, scales = (self.codes[:n], self.scales[:n]) if self.codes is not None else (None, None)
+        if n == 0:
+            return {"ids": [[] for _ in query_embeddings], "distances": [[] for _ in query_embeddings]}
+        queries = np.asarray(query_embeddings, dtype=np.float32).reshape(-1, self.dim)
+        mask = self._mask(where, n)
+        k = min(n_results, n if mask is None else int(mask.sum()))
+        if exact is None:
+            exact = self.quantization == "none"
+
+        if exact or codes is None:
+            distances = self.distances(queries, vectors[:n], sq_norms)
+            if mask is not None:
+                distances[:, ~mask] = np.inf
+            return self.top_k(distances, k, ids)
+
+        approximate = self.approximate_distances(queries, codes, scales, sq_norms)
+        if mask is not None:
+            approximate[:, ~mask] = np.inf
+        m = min(max(k * self.rerank_factor, k), n if mask is None else int(mask.sum()))
+        if k <= 0:
+            return self.top_k(approximate, k, ids)
+        candidates = np.argpartition(approximate, m - 1, axis=1)[:, :m] if m < n else np.tile(np.arange(n), (len(queries), 1))
+
+        # exact re-ranking only reads the candidates' float32 rows
+        candidate_vectors = np.asarray(vectors[candidates.reshape(-1)]).reshape(len(queries), m, self.dim)
+        products = np.einsum("qd,qmd->qm", queries, candidate_vectors)
+        query_sq_norms = np.einsum("ij,ij->i", queries, queries)[:, None]
+        distances = self._from_products(products, query_sq_norms, sq_norms[candidates])
+        if mask is not None:
+            distances[~mask[candidates]] = np.inf
+        reranked = self.top_k(distances, k, list(range(m)))
+        return {
+            "ids": [[ids[candidates[q, i]] for i in rows] for q, rows in enumerate(reranked["ids"])],
+            "distances": reranked["distances"],
+        }
+
+    def recall_at_k(self, query_embeddings, n_results=10, where=None):
+        """
+        Fraction of the exact top n_results that the (quantized) search finds, averaged over the queries.
+        """
+        found = self.query(query_embeddings, n_results, where)["ids"]
+        expected = self.query(query_embeddings, n_results, where, exact=True)["ids"]
+        recalls = [len(set(f) & set(e)) / len(e) for f, e in zip(found, expected) if e]
+        return float(np.mean(recalls)) if recalls else 1.0
+
+    @staticmethod
+    def top_k(distances, k, ids):
+        if k <= 0:
+            return {"ids": [[] for _ in distances], "distances": [[] for _ in distances]}
+        if k < distances.shape[1]:
+            candidates = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        else:
+            candidates = np.broadcast_to(np.arange(distances.shape[1]), distances.shape)
+        candidate_distances = np.take_along_axis(distances, candidates, axis=1)
+        order = np.argsort(candidate_distances, axis=1, kind="stable")
+        rows = np.take_along_axis(candidates, order, axis=1)
+        nearest = np.take_along_axis(candidate_distances, order, axis=1)
+        return {
+            "ids": [[ids[row] for row in query_rows] for query_rows in rows],
+            "distances": nearest.tolist(),
+        }
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# vectordb modules import each other as top-level modules, as they do when the services are run from vectordb/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
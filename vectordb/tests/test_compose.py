@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("chromadb")
+pytest.importorskip("ollama")
+
+from vectordb import VectorDB
+
+
+class FakeEmbedder:
+    """Embeds each text to a fixed random unit vector and records what it was asked to embed."""
+
+    def __init__(self, dim=8):
+        self.dim = dim
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return [np.random.default_rng(abs(hash(text)) % 2 ** 32).standard_normal(self.dim) for text in texts]
+
+
+@pytest.fixture
+def db():
+    # compose only needs embed, which is replaced so no embedder or collection is needed
+    db = VectorDB.__new__(VectorDB)
+    db.embed = FakeEmbedder()
+    return db
+
+
+def test_compose_raises_when_no_list_has_interests(db):
+    with pytest.raises(ValueError):
+        db.compose([[], []])
+    with pytest.raises(ValueError):
+        db.compose([])
+    assert db.embed.calls == []
+
+
+def test_compose_gives_empty_lists_a_zero_vector_of_full_dim(db):
+    vectors = db.compose([["ai", "music"], []])
+
+    assert vectors.shape == (2, db.embed.dim)
+    assert np.linalg.norm(vectors[0]) == pytest.approx(1.0)
+    assert not vectors[1].any()
+
+
+def test_compose_embeds_each_interest_once_and_ignores_order(db):
+    vectors = db.compose([["ai", "music"], ["music", "ai"], ["ai"]], [[2.0, 1.0], [1.0, 2.0], [1.0]])
+
+    assert db.embed.calls == [["ai", "music"]]
+    np.testing.assert_allclose(vectors[0], vectors[1], rtol=1e-6)
+    assert not np.allclose(vectors[0], vectors[2])
@@ -0,0 +1,33 @@
+import numpy as np
+
+from embedding_cache import EmbeddingCache
+
+
+def test_cache_survives_reopen_and_normalizes_text(tmp_path):
+    vectors = np.random.default_rng(0).standard_normal((3, 4)).astype(np.float32)
+    cache = EmbeddingCache(str(tmp_path), "model", memory_items=1, disk_items=10)
+    cache.put_many(["a b", "c", "d"], vectors)
+
+    reopened = EmbeddingCache(str(tmp_path), "model", memory_items=1, disk_items=10)
+    found = reopened.get_many(["a  b", "c", "missing"])
+
+    np.testing.assert_array_equal(found[0], vectors[0])
+    np.testing.assert_array_equal(found[1], vectors[1])
+    assert found[2] is None
+    assert reopened.stats()["disk_hits"] == 2
+
+
+def test_disk_store_grows_up_to_disk_items(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "model", memory_items=1, disk_items=1500)
+    cache.put_many([str(i) for i in range(2000)], np.ones((2000, 2), dtype=np.float32))
+
+    assert cache.stats()["disk_items"] == 1500
+    assert cache.matrix.capacity == 1500
+    assert len(EmbeddingCache(str(tmp_path), "model", disk_items=1500).rows) == 1500
+
+
+def test_models_do_not_share_entries(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "a"), "a", disk_items=10)
+    cache.put_many(["text"], np.ones((1, 2), dtype=np.float32))
+
+    assert EmbeddingCache(str(tmp_path / "a"), "b", disk_items=10).get_many(["text"]) == [None]
@@ -0,0 +1,136 @@
+import numpy as np
+import pytest
+
+from numpy_index import NumpyCollection
+
+
+def random_vectors(n, dim, rng):
+    vectors = rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def brute_force_mask(collection, where, n):
+    return np.array([
+        all((collection.metadatas.get(id) or {}).get(key) == value for key, value in where.items())
+        for id in collection.ids[:n]
+    ])
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(0)
+
+
+@pytest.mark.parametrize("space", ["ip", "cosine", "l2"])
+def test_query_matches_brute_force(tmp_path, rng, space):
+    collection = NumpyCollection(str(tmp_path), space=space, quantization="none")
+    vectors = random_vectors(500, 16, rng)
+    collection.upsert(ids=[str(i) for i in range(500)], embeddings=vectors)
+    query = random_vectors(1, 16, rng)
+
+    result = collection.query(query, n_results=5)
+
+    if space == "l2":
+        expected = ((vectors - query) ** 2).sum(axis=1)
+    elif space == "cosine":
+        expected = 1 - vectors @ query[0] / np.linalg.norm(vectors, axis=1) / np.linalg.norm(query)
+    else:
+        expected = 1 - vectors @ query[0]
+    assert result["ids"][0] == [str(i) for i in np.argsort(expected)[:5]]
+    np.testing.assert_allclose(result["distances"][0], np.sort(expected)[:5], rtol=1e-4, atol=1e-5)
+
+
+def test_mask_matches_metadata_filter(tmp_path, rng):
+    collection = NumpyCollection(str(tmp_path), quantization="none")
+    ids = [str(i) for i in range(300)]
+    metadatas = [
+        {"region": ["north", "south", "east"][i % 3], "type": "talk" if i % 2 else "workshop"} if i % 7 else {"region": "west"}
+        for i in range(300)
+    ]
+    collection.upsert(ids=ids, embeddings=random_vectors(300, 8, rng), metadatas=metadatas)
+    # re-upserting drops keys the new metadata does not have
+    collection.upsert(ids=ids[:50], embeddings=random_vectors(50, 8, rng), metadatas=[{"region": "north"}] * 50)
+
+    for where in [{"region": "north"}, {"region": "west"}, {"region": "north", "type": "talk"}, {"missing": "x"}]:
+        np.testing.assert_array_equal(collection._mask(where, 300), brute_force_mask(collection, where, 300))
+    np.testing.assert_array_equal(collection._mask({"type": {"$eq": "talk"}}, 300), brute_force_mask(collection, {"type": "talk"}, 300))
+
+    result = collection.query(random_vectors(2, 8, rng), n_results=400, where={"region": "north", "type": "talk"})
+    expected = {id for id, keep in zip(ids, brute_force_mask(collection, {"region": "north", "type": "talk"}, 300)) if keep}
+    assert all(set(ids_) == expected for ids_ in result["ids"])
+
+
+def test_records_are_compacted_once_mostly_superseded(tmp_path, rng, monkeypatch):
+    monkeypatch.setattr(NumpyCollection, "COMPACT_MIN_LINES", 10)
+    collection = NumpyCollection(str(tmp_path), quantization="none")
+    ids = [str(i) for i in range(10)]
+    collection.upsert(ids=ids, embeddings=random_vectors(10, 4, rng), metadatas=[{"version": 0}] * 10)
+    for version in range(1, 4):
+        collection.upsert(ids=ids, embeddings=random_vectors(10, 4, rng), metadatas=[{"version": version}] * 10)
+        assert collection.record_lines <= 2 * len(ids)
+
+    with open(tmp_path / "records.jsonl") as f:
+        assert len(f.readlines()) == collection.record_lines
+
+    reopened = NumpyCollection(str(tmp_path), quantization="none")
+    assert reopened.metadatas == {id: {"version": 3} for id in ids}
+    assert reopened._mask({"version": 3}, 10).all()
+
+
+def clustered_vectors(n, dim, rng, centers):
+    vectors = centers[rng.integers(0, len(centers), n)] + 0.3 * rng.standard_normal((n, dim))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+@pytest.fixture
+def clustered(rng):
+    # embeddings of interests cluster by topic, which is what the sign bits of binary codes keep apart
+    centers = rng.standard_normal((10, 32))
+    return clustered_vectors(500, 32, rng, centers), clustered_vectors(20, 32, rng, centers)
+
+
+@pytest.mark.parametrize("quantization, rerank_factor", [("int8", 10), ("binary", 20)])
+def test_quantized_query_matches_exact_top_k(tmp_path, clustered, quantization, rerank_factor):
+    vectors, queries = clustered
+    ids = [str(i) for i in range(len(vectors))]
+    exact = NumpyCollection(str(tmp_path / "exact"), quantization="none")
+    exact.upsert(ids=ids, embeddings=vectors)
+    quantized = NumpyCollection(str(tmp_path / quantization), quantization=quantization, rerank_factor=rerank_factor)
+    quantized.upsert(ids=ids, embeddings=vectors)
+
+    expected = exact.query(queries, n_results=5)
+    result = quantized.query(queries, n_results=5)
+
+    assert result["ids"] == expected["ids"]
+    # re-ranking reports exact float32 distances, not the approximate ones of the first pass
+    np.testing.assert_allclose(result["distances"], expected["distances"], rtol=1e-5, atol=1e-6)
+    assert quantized.recall_at_k(queries, n_results=5) == 1.0
+
+
+@pytest.mark.parametrize("quantization", ["int8", "binary"])
+def test_quantized_query_applies_where_filter(tmp_path, clustered, quantization):
+    vectors, queries = clustered
+    ids = [str(i) for i in range(len(vectors))]
+    metadatas = [{"parity": i % 2} for i in range(len(vectors))]
+    collection = NumpyCollection(str(tmp_path), quantization=quantization, rerank_factor=20)
+    collection.upsert(ids=ids, embeddings=vectors, metadatas=metadatas)
+
+    result = collection.query(queries, n_results=5, where={"parity": 1})
+
+    assert all(len(row) == 5 and all(int(id) % 2 == 1 for id in row) for row in result["ids"])
+    assert result["ids"] == collection.query(queries, n_results=5, where={"parity": 1}, exact=True)["ids"]
+
+
+@pytest.mark.parametrize("quantization", ["int8", "binary"])
+def test_reopened_quantized_collection_queries_the_same(tmp_path, clustered, quantization):
+    vectors, queries = clustered
+    ids = [str(i) for i in range(len(vectors))]
+    collection = NumpyCollection(str(tmp_path), quantization=quantization, rerank_factor=20)
+    collection.upsert(ids=ids, embeddings=vectors)
+    before = collection.query(queries, n_results=5)
+
+    reopened = NumpyCollection(str(tmp_path), quantization=quantization, rerank_factor=20)
+
+    assert reopened.count() == len(ids)
+    np.testing.assert_array_equal(reopened.codes[:len(ids)], collection.codes[:len(ids)])
+    assert reopened.query(queries, n_results=5) == before
@@ -1,9 +1,16 @@
+import logging
 import ollama
 import os
 import random
+import time
+
+import numpy as np
 import chromadb
 from chromadb.config import Settings
 
+from embedding_cache import EmbeddingCache
+from numpy_index import NumpyCollection
+
 class VectorDB:
     """
     Class to define Vector DB to use to store & queries semantics (list of words or just words?)
@@ -13,25 +20,58 @@ class VectorDB:
     embed it and do a query against the vector DB, to find closest interests.
     """
 
-    def __init__(self, db_path, collection_name, embedder, distance_type='ip'):
+    def __init__(self, db_path, collection_name, embedder, distance_type='ip', backend=None):
         """
         TODO: document this. HAHA jk!
+
+        backend is "chroma" (HNSW) or "numpy" (exact search, see numpy_index), defaults to the VECTOR_BACKEND env var.
         """
         DIR = os.path.dirname(os.path.abspath(__file__))
         DB_PATH = os.path.join(DIR, db_path)
-        self.client = chromadb.PersistentClient(path=DB_PATH, settings=Settings(allow_reset=True, anonymized_telemetry=False))
+        self.backend = backend or os.getenv("VECTOR_BACKEND", "chroma")
         print(DB_PATH, "DB PATH !!!!")
-        self.collection = self.client.get_or_create_collection(
-            name=collection_name, 
-            metadata={
-                'hnsw:space':distance_type
-            }
-        )
+        if self.backend == "numpy":
+            self.client = None
+            self.collection = NumpyCollection(os.path.join(DB_PATH, f"numpy_{collection_name}"), space=distance_type)
+        elif self.backend == "chroma":
+            self.client = chromadb.PersistentClient(path=DB_PATH, settings=Settings(allow_reset=True, anonymized_telemetry=False))
+            self.collection = self.client.get_or_create_collection(
+                name=collection_name, 
+                metadata={
+                    'hnsw:space':distance_type
+                }
+            )
+        else:
+            raise ValueError(f"Unknown vector backend: {self.backend}")
         self.distance_type = distance_type
 
         # categories_file = "./database/categories.txt"
         # self.embedder = "mxbai-embed-large"
         self.embedder = embedder
+        self.embed_batch_size = int(os.getenv("EMBED_BATCH_SIZE", 64))
+        self.embedding_cache = None
+        if os.getenv("EMBEDDING_CACHE", "true").lower() == "true":
+            cache_path = os.path.join(DB_PATH, "embedding_cache", embedder.replace(":", "_").replace("/", "_"))
+            self.embedding_cache = EmbeddingCache(cache_path, embedder)
+
+    def embed(self, queries):
+        """
+        Embeds a list of strings, taking whatever it can from the embedding cache and embedding
+        the rest (de-duplicated) in one call.
+
+        Returns:
+            - embeddings: list of lists of floats, one per query
+        """
+        if self.embedding_cache is None:
+            return ollama.embed(model=self.embedder, input=queries)["embeddings"]
+        embeddings = self.embedding_cache.get_many(queries)
+        missing = list(dict.fromkeys(query for query, embedding in zip(queries, embeddings) if embedding is None))
+        if missing:
+            new_embeddings = ollama.embed(model=self.embedder, input=missing)["embeddings"]
+            self.embedding_cache.put_many(missing, new_embeddings)
+            by_query = dict(zip(missing, new_embeddings))
+            embeddings = [by_query[query] if embedding is None else embedding for query, embedding in zip(queries, embeddings)]
+        return [embedding.tolist() if hasattr(embedding, 'tolist') else embedding for embedding in embeddings]
 
     def add(self, id, query: str, metadatas=None):
         """
@@ -42,26 +82,147 @@ class VectorDB:
             - query: strings to embed.
             - metadatas: emtadata to store alonside the query
         """
-        response = ollama.embed(model=self.embedder, input=query)
-        embeddings = response["embeddings"] 
+        embeddings = self.embed([query])
         # print("EMBEDDINGS???", embeddings)
-        self.collection.add(
+        # upsert so that re-embedding an id (e.g. an event whose description changed) replaces its vector
+        self.collection.upsert(
             ids=id,
             embeddings=embeddings,
             documents=query,
             metadatas=metadatas,
         )
 
+    def compose(self, interest_lists, weights=None):
+        """
+        Composes one vector per list of interests by weighted pooling of per-interest embeddings, so each
+        distinct interest is only ever embedded once (then served from the embedding cache) and the result
+        does not depend on the order of the interests.
+
+        Params:
+            - interest_lists: list of lists of strings.
+            - weights: optional list of lists of floats aligned with interest_lists, e.g. INTERESTED_IN weightages.
+              Defaults to equal weights.
+
+        Returns:
+            - vectors: float32 array of shape (len(interest_lists), dim), L2 normalized. Lists without
+              interests (or with only zero weights) get a zero vector.
+
+        Raises:
+            - ValueError if no list has any interest, there is nothing to embed to learn dim from.
+        """
+        if weights is None:
+            weights = [[1.0] * len(interests) for interests in interest_lists]
+        vocabulary = list(dict.fromkeys(interest for interests in interest_lists for interest in interests))
+        if not vocabulary:
+            raise ValueError("compose needs at least one interest to embed")
+        index = {interest: i for i, interest in enumerate(vocabulary)}
+
+        interest_vectors = np.asarray(self.embed(vocabulary), dtype=np.float32)
+        interest_vectors /= np.maximum(np.linalg.norm(interest_vectors, axis=1, keepdims=True), 1e-12)
+
+        # sparse (list, interest) weights as a dense matrix, repeated interests in a list add up
+        pooling = np.zeros((len(interest_lists), len(vocabulary)), dtype=np.float32)
+        rows = np.repeat(np.arange(len(interest_lists)), [len(interests) for interests in interest_lists])
+        cols = np.fromiter((index[interest] for interests in interest_lists for interest in interests), dtype=np.intp, count=len(rows))
+        np.add.at(pooling, (rows, cols), np.fromiter((w for ws in weights for w in ws), dtype=np.float32, count=len(rows)))
+
+        vectors = pooling @ interest_vectors
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return vectors
+
+    def add_many(self, ids, queries, metadatas=None, batch_size=None, embeddings=None):
+        """
+        Embeds and stores many queries, batch_size at a time: one embed call and one bulk upsert per batch.
+
+        Params:
+            - ids: list of strings to identify embeddings by.
+            - queries: list of strings to embed, same length as ids.
+            - metadatas: optional list of metadata dicts, same length as ids.
+            - batch_size: queries per embed call, defaults to the EMBED_BATCH_SIZE env var (64).
+            - embeddings: optional precomputed embeddings (e.g. from compose) to store instead of embedding
+              queries, which are then only stored as documents.
+
+        Returns:
+            - stats: dict with the number of items, total seconds, items_per_second and per batch stats
+        """
+        batch_size = batch_size or self.embed_batch_size
+        # chroma rejects writes bigger than its max batch size
+        if self.client is not None:
+            batch_size = min(batch_size, self.client.get_max_batch_size())
+        stats = {'items': 0, 'seconds': 0.0, 'items_per_second': 0.0, 'batches': []}
+        for start in range(0, len(ids), batch_size):
+            batch_ids = list(ids[start:start + batch_size])
+            batch_queries = list(queries[start:start + batch_size])
+            batch_metadatas = list(metadatas[start:start + batch_size]) if metadatas is not None else None
+
+            embed_start = time.perf_counter()
+            if embeddings is None:
+                batch_embeddings = self.embed(batch_queries)
+            else:
+                batch_embeddings = [list(map(float, embedding)) for embedding in embeddings[start:start + batch_size]]
+            write_start = time.perf_counter()
+            self.collection.upsert(
+                ids=batch_ids,
+                embeddings=batch_embeddings,
+                documents=batch_queries,
+                metadatas=batch_metadatas,
+            )
+            end = time.perf_counter()
+
+            batch = {
+                'items': len(batch_ids),
+                'embed_seconds': write_start - embed_start,
+                'write_seconds': end - write_start,
+                'items_per_second': len(batch_ids) / max(end - embed_start, 1e-9),
+            }
+            stats['batches'].append(batch)
+            stats['items'] += batch['items']
+            stats['seconds'] += end - embed_start
+            logging.debug(
+                f"add_many batch {len(stats['batches'])}: {batch['items']} items, embed {batch['embed_seconds']:.3f}s, "
+                f"write {batch['write_seconds']:.3f}s, {batch['items_per_second']:.1f} items/s"
+            )
+        stats['items_per_second'] = stats['items'] / max(stats['seconds'], 1e-9)
+        return stats
+
     def retrieve(self, query: str, condition_dict=None, top_n=5, distance_type=None):
         """
         Boilerplate code to take an un-embedded query, and search it against the db.
         """
         if distance_type is None:
             distance_type = self.distance_type
-        query = ollama.embed(model=self.embedder, input=query)
+        return self.retrieve_by_embeddings(self.embed([query]), condition_dict, top_n)
+
+    def retrieve_many(self, ids, queries=None, condition_dict=None, top_n=5, embeddings=None):
+        """
+        Searches many queries at once: one embed call for all of them (less whatever the embedding cache has)
+        and one multi-vector query.
 
+        Params:
+            - ids: list of caller ids (e.g. usernames), one per query, to key the results by.
+            - queries: list of strings to embed, or None when embeddings are given.
+            - condition_dict & top_n: To pass to the collection query.
+            - embeddings: optional precomputed query embeddings (e.g. from compose).
+
+        Returns:
+            - results: dict of caller id to a list of [id, distance] pairs, nearest first
+        """
+        if not ids:
+            return {}
+        if embeddings is None:
+            embeddings = self.embed(list(queries))
+        results = self.retrieve_by_embeddings(embeddings, condition_dict, top_n)
+        return {
+            id: [[hit_id, distance] for hit_id, distance in zip(hit_ids, distances)]
+            for id, hit_ids, distances in zip(ids, results['ids'], results['distances'])
+        }
+
+    def retrieve_by_embeddings(self, embeddings, condition_dict=None, top_n=5):
+        """
+        Searches already embedded queries (list of vectors) against the db.
+        """
         results = self.collection.query(
-            query_embeddings=query['embeddings'],
+            query_embeddings=[list(map(float, embedding)) for embedding in embeddings],
             n_results=top_n,
             where=condition_dict,
             # distance_type=distance_type
@@ -87,6 +248,3 @@ class VectorDB:
         distances = nested_distances[0]
 
         return [[id, distance] for id, distance in zip(ids, distances)]
-
-
-